@@ -0,0 +1,686 @@
+import bisect
+import collections
+import csv
+import functools
+import ipaddress
+import itertools
+import json
+from datetime import datetime
+from pathlib import Path  # OS-agnostic file handling
+
+from classdefs import get_standard_app_registry, parse_port_range
+from constdefs import *
+from profile_handlers import count
+
+any_network = ipaddress.IPv4Network("0.0.0.0/0")
+all_ports = (0, 65535)
+
+
+# --------------------------------------- Classes - PrefixIndexClass ---------------------------------------
+class PrefixIndexClass:
+
+    """ Prefix tree over IPv4 networks, flattened into one hash table per prefix length.
+    Finding all stored networks which cover a given network takes at most 33 lookups.
+    Values which are not networks, such as DNS names, are matched by name
+    """
+
+    def __init__(self):
+        self.Networks = {}
+        self.PrefixLengths = []
+        self.Names = collections.defaultdict(set)
+
+    def add(self, address, value):
+        """
+        :param address: IPv4Network object or a name
+        :param value: value to store, such as rule id
+        """
+        if isinstance(address, ipaddress.IPv4Network):
+            key = (address.prefixlen, int(address.network_address))
+            if key not in self.Networks:
+                self.Networks[key] = set()
+                if address.prefixlen not in self.PrefixLengths:
+                    bisect.insort(self.PrefixLengths, address.prefixlen)
+            self.Networks[key].add(value)
+        else:
+            self.Names[address].add(value)
+
+    def get_covering_sets(self, address):
+        """
+        :param address: IPv4Network object or a name
+        :return: list of value sets stored at networks which contain the address
+        """
+        covering_sets = []
+
+        if isinstance(address, ipaddress.IPv4Network):
+            network = int(address.network_address)
+            for prefixlen in self.PrefixLengths:
+                if prefixlen > address.prefixlen:
+                    break
+                mask = (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF
+                found = self.Networks.get((prefixlen, network & mask))
+                if found:
+                    covering_sets.append(found)
+        else:
+            # Name is covered only by the same name or by any
+            if address in self.Names:
+                covering_sets.append(self.Names[address])
+            found = self.Networks.get((0, 0))
+            if found:
+                covering_sets.append(found)
+
+        return covering_sets
+
+
+# --------------------------------------- Classes - PortIndexClass ---------------------------------------
+class PortIndexClass:
+
+    """ Index of (protocol, first port, last port) services.
+    Single ports and exact ranges are found by hash, wider port ranges are kept per protocol sorted by first port
+    """
+
+    def __init__(self):
+        self.Services = {}
+        self.Ranges = collections.defaultdict(list)
+
+    def add(self, service, value):
+        """
+        :param service: (protocol, first port, last port) tuple
+        :param value: value to store, such as rule id
+        """
+        if service not in self.Services:
+            self.Services[service] = set()
+            protocol, first_port, last_port = service
+            if first_port != last_port:
+                bisect.insort(self.Ranges[protocol], (first_port, last_port))
+        self.Services[service].add(value)
+
+    def get_covering_sets(self, service):
+        """
+        :param service: (protocol, first port, last port) tuple
+        :return: list of value sets stored at services which contain the given one
+        """
+        protocol, first_port, last_port = service
+        covering_sets = []
+
+        found = self.Services.get(service)
+        if found:
+            covering_sets.append(found)
+
+        ranges = self.Ranges.get(protocol, [])
+        for range_first_port, range_last_port in ranges[: bisect.bisect_right(ranges, (first_port, 65536))]:
+            if range_last_port >= last_port and (range_first_port, range_last_port) != (first_port, last_port):
+                covering_sets.append(self.Services[(protocol, range_first_port, range_last_port)])
+
+        return covering_sets
+
+
+# --------------------------------------- Classes - RuleMatchClass ---------------------------------------
+class RuleMatchClass:
+
+    """ Traffic matched by a rule - zone pairs, networks and services, with names resolved through the catalog
+    """
+
+    def __init__(self, acl, catalog):
+
+        self.Name = acl.Name
+        self.RuleAction = acl.RuleAction
+
+        self.ZonePairs = set(
+            itertools.product(catalog.get_zone_set(acl.SourceZone), catalog.get_zone_set(acl.DestinationZone))
+        )
+        self.Sources = resolve_addresses(acl.SourceNetworkAndMask, catalog)
+        self.Destinations = resolve_addresses(acl.DestinationNetworkAndMask, catalog)
+        self.Services = resolve_services(acl.Protocol, acl.DestinationPort, catalog)
+
+        self.Signature = (
+            frozenset(self.ZonePairs),
+            frozenset(self.Sources),
+            frozenset(self.Destinations),
+            frozenset(self.Services),
+        )
+
+    def covers(self, other):
+        """
+        :param other: RuleMatchClass object
+        :return: True if every packet matched by other rule is matched by this rule
+        """
+        return (
+            other.ZonePairs <= self.ZonePairs
+            and all(covers_address(self.Sources, address) for address in other.Sources)
+            and all(covers_address(self.Destinations, address) for address in other.Destinations)
+            and all(covers_service(self.Services, service) for service in other.Services)
+        )
+
+
+# --------------------------------------- Classes - FlowLookupClass ---------------------------------------
+class FlowLookupClass:
+
+    """ Answers whether a flow is permitted - first enabled rule, in Traffic Flows order, which matches the whole flow.
+    Rules are indexed per zone pair by source and destination prefix and by service, as in analyze_rules
+    """
+
+    def __init__(self, acl_list, catalog):
+        """
+        :param acl_list: list of AccessRuleClass objects
+        :param catalog: CatalogClass object
+        """
+        self.Catalog = catalog
+        # (row, rule name, rule action) by rule id
+        self.Rules = []
+        self.Indexes = collections.defaultdict(lambda: (PrefixIndexClass(), PrefixIndexClass(), PortIndexClass()))
+
+        for acl in acl_list:
+            if acl.Action != ActionEnable:
+                continue
+            rule = RuleMatchClass(acl, self.Catalog)
+            index_rule(rule, len(self.Rules), self.Indexes)
+            self.Rules.append((acl.Row, rule.Name, rule.RuleAction))
+
+    def lookup(self, source_zone, destination_zone, source, destination, protocol, port_or_app):
+        """
+        :param source_zone: zone or zone set name, a zone set flow must be matched for every zone pair
+        :param destination_zone: zone or zone set name
+        :param source: network, host or Address Book object name
+        :param destination: network, host or Address Book object name
+        :param protocol: protocol, such as tcp
+        :param port_or_app: port, port range or application name
+        :return: (row, rule name, rule action) of the first matching rule, None if no rule matches
+        """
+        count("flow lookups")
+
+        items = (
+            next(iter(resolve_addresses([source], self.Catalog))),
+            next(iter(resolve_addresses([destination], self.Catalog))),
+            next(iter(resolve_services(protocol, [port_or_app], self.Catalog))),
+        )
+
+        # Covering sets of each zone pair and dimension, a rule matches if it's in one set of every dimension
+        dimensions = []
+        for zone_pair in itertools.product(
+            self.Catalog.get_zone_set(source_zone) or [source_zone],
+            self.Catalog.get_zone_set(destination_zone) or [destination_zone],
+        ):
+            if zone_pair not in self.Indexes:
+                return None
+            for index, item in zip(self.Indexes[zone_pair], items):
+                covering_sets = index.get_covering_sets(item)
+                if not covering_sets:
+                    return None
+                dimensions.append(covering_sets)
+
+        # Candidates come from the most selective dimension, in rule order
+        dimensions.sort(key=lambda covering_sets: sum(len(found) for found in covering_sets))
+        for rule_id in sorted(set().union(*dimensions[0])):
+            if all(any(rule_id in found for found in covering_sets) for covering_sets in dimensions[1:]):
+                return self.Rules[rule_id]
+        return None
+
+
+def resolve_addresses(address_list, catalog):
+    """
+    :param address_list: Source or Destination Network values of a rule
+    :param catalog: CatalogClass object
+    :return: set of IPv4Network objects, DNS names and undefined object names are kept as names
+    """
+    if "any" in address_list:
+        return {any_network}
+
+    return {parse_address(catalog.AddressBook.get(address, address)) for address in address_list}
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_address(value):
+    # Same networks and objects are used by many rules, parse each one once
+    count("ipaddress parses")
+    try:
+        return ipaddress.IPv4Network(value)
+    except ValueError:
+        return value
+
+
+def resolve_services(protocol, port_list, catalog):
+    """
+    :param protocol: Protocol of a rule, such as TCP
+    :param port_list: Destination Port or Application values of a rule
+    :param catalog: CatalogClass object
+    :return: set of (protocol, first port, last port) tuples.
+        Applications without TCP or UDP ports are kept as (protocol/application, 0, 0)
+    """
+    protocol = protocol.lower()
+    services = set()
+
+    for port_or_app in port_list:
+        if port_or_app == "any":
+            services.add((protocol, *all_ports))
+            continue
+
+        part = port_or_app.split("-")
+        if all(value.isdigit() for value in part) and len(part) <= 2:
+            services.add((protocol, int(part[0]), int(part[-1])))
+            continue
+
+        app_protocol, app_port = catalog.Applications.get(port_or_app, ("", ""))
+        if app_protocol in ("tcp", "udp") and str(app_port).isdigit():
+            services.add((app_protocol, int(app_port), int(app_port)))
+        else:
+            services.add((f"{app_protocol}/{port_or_app}", 0, 0))
+
+    return services
+
+
+def covers_address(addresses, address):
+    if any_network in addresses or address in addresses:
+        return True
+    if isinstance(address, ipaddress.IPv4Network):
+        return any(
+            isinstance(network, ipaddress.IPv4Network) and address.subnet_of(network) for network in addresses
+        )
+    return False
+
+
+def covers_service(services, service):
+    protocol, first_port, last_port = service
+    return any(
+        protocol == other_protocol and other_first_port <= first_port and last_port <= other_last_port
+        for other_protocol, other_first_port, other_last_port in services
+    )
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def analyze_rules(acl_list, catalog):
+    """
+    Find enabled rules which never match traffic, because an earlier rule with the same zones covers them,
+    and groups of rules which could be merged into one.
+    Earlier rules are indexed per zone pair by source and destination prefix and by service,
+    so each rule is compared only with rules which can cover it
+
+    :param acl_list: list of AccessRuleClass objects
+    :param catalog: CatalogClass object
+    :return: report dictionary - lists of shadowed, redundant and mergeable rules
+    """
+
+    rules = []
+    indexes = collections.defaultdict(lambda: (PrefixIndexClass(), PrefixIndexClass(), PortIndexClass()))
+    report = {"rules": 0, "shadowed": [], "redundant": [], "mergeable": []}
+
+    for acl in acl_list:
+        if acl.Action != ActionEnable:
+            continue
+
+        rule = RuleMatchClass(acl, catalog)
+        rule_id = len(rules)
+        rules.append(rule)
+
+        covering_id = find_covering_rule(rule, rules, indexes)
+        if covering_id is not None:
+            covering_rule = rules[covering_id]
+            finding = {"rule": rule.Name, "covered_by": covering_rule.Name}
+            if covering_rule.RuleAction == rule.RuleAction:
+                report["redundant"].append(finding)
+            else:
+                finding["action"] = rule.RuleAction
+                finding["covered_by_action"] = covering_rule.RuleAction
+                report["shadowed"].append(finding)
+
+        index_rule(rule, rule_id, indexes)
+
+    report["rules"] = len(rules)
+    report["mergeable"] = find_mergeable_rules(rules, report)
+
+    return report
+
+
+def index_rule(rule, rule_id, indexes):
+    """
+    :param rule: RuleMatchClass object
+    :param rule_id: position of the rule
+    :param indexes: per zone pair (source, destination, service) indexes to add the rule to
+    """
+
+    for zone_pair in rule.ZonePairs:
+        source_index, destination_index, service_index = indexes[zone_pair]
+        for address in rule.Sources:
+            source_index.add(address, rule_id)
+        for address in rule.Destinations:
+            destination_index.add(address, rule_id)
+        for service in rule.Services:
+            service_index.add(service, rule_id)
+
+
+def find_covering_rule(rule, rules, indexes):
+    """
+    :param rule: RuleMatchClass object, not yet indexed
+    :param rules: list of RuleMatchClass objects, position is rule id
+    :param indexes: per zone pair (source, destination, service) indexes of earlier rules
+    :return: id of the first earlier rule which covers the rule, or None
+    """
+
+    if not rule.ZonePairs:
+        return None
+
+    # Collect covering sets per rule item, without merging them yet
+    dimensions = []
+    for zone_pair in rule.ZonePairs:
+        if zone_pair not in indexes:
+            return None
+        source_index, destination_index, service_index = indexes[zone_pair]
+        for index, items in (
+            (source_index, rule.Sources),
+            (destination_index, rule.Destinations),
+            (service_index, rule.Services),
+        ):
+            item_sets = [index.get_covering_sets(item) for item in items]
+            if not all(item_sets):
+                return None
+            dimensions.append(item_sets)
+
+    # Candidates come from the most selective dimension, other dimensions are checked rule by rule
+    item_sets = min(dimensions, key=lambda sets: sum(len(found) for covering_sets in sets for found in covering_sets))
+    candidates = None
+    for covering_sets in item_sets:
+        item_candidates = set().union(*covering_sets)
+        candidates = item_candidates if candidates is None else candidates & item_candidates
+        if not candidates:
+            return None
+
+    for candidate_id in sorted(candidates):
+        if rules[candidate_id].covers(rule):
+            return candidate_id
+    return None
+
+
+def find_mergeable_rules(rules, report):
+    """
+    Rules with the same zones and action which differ only in one of sources, destinations or services
+
+    :param rules: list of RuleMatchClass objects
+    :param report: report with shadowed and redundant rules, these are not suggested for merging
+    :return: list of mergeable groups
+    """
+
+    unused_rules = {finding["rule"] for finding in report["shadowed"] + report["redundant"]}
+    groups = collections.defaultdict(list)
+
+    for rule in rules:
+        if rule.Name in unused_rules:
+            continue
+        zone_pairs, sources, destinations, services = rule.Signature
+        groups[("services", zone_pairs, rule.RuleAction, sources, destinations)].append(rule.Name)
+        groups[("destinations", zone_pairs, rule.RuleAction, sources, services)].append(rule.Name)
+        groups[("sources", zone_pairs, rule.RuleAction, destinations, services)].append(rule.Name)
+
+    return [{"merge": key[0], "rules": names} for key, names in groups.items() if len(names) > 1]
+
+
+# -------------------------------------------------------------------------------------------
+
+query_columns = [
+    SourceZoneColumnName,
+    SourceNetworkColumnName,
+    DestinationZoneColumnName,
+    DestinationNetworkColumnName,
+    ProtocolColumnName,
+    DestinationPortColumnName,
+]
+
+
+def query_flows(flow_lookup, query_filename):
+    """
+    Look up each flow of a CSV file, with the same column names as Traffic Flows sheet:
+    Source Zone, Source Network, Destination Zone, Destination Network, Protocol, Destination Port or Application
+
+    :param flow_lookup: FlowLookupClass object
+    :param query_filename: CSV file
+    :return: report dictionary - results with matching rule of each flow, numbers of permitted and denied flows
+    :raises ValueError: if a column is missing, or a row has no value in one of the columns
+    """
+
+    report = {"queries": 0, "permitted": 0, "denied": 0, "no_match": 0, "results": []}
+
+    with open(query_filename, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        missing_columns = [name for name in query_columns if name not in (reader.fieldnames or [])]
+        if missing_columns:
+            print(f"Columns {', '.join(missing_columns)} are missing in {query_filename}")
+            raise ValueError(f"Missing columns in {query_filename}")
+
+        for query in reader:
+            # Short rows have None values, a flow without a network or port can't be looked up
+            result = {name: str(query[name] or "").strip() for name in query_columns}
+            empty_columns = [name for name in query_columns if not result[name]]
+            if empty_columns:
+                print(f"Line {reader.line_num} of {query_filename} has no values in columns {', '.join(empty_columns)}")
+                raise ValueError(f"Incomplete flow in line {reader.line_num} of {query_filename}")
+
+            match = flow_lookup.lookup(
+                result[SourceZoneColumnName],
+                result[DestinationZoneColumnName],
+                result[SourceNetworkColumnName],
+                result[DestinationNetworkColumnName],
+                result[ProtocolColumnName],
+                result[DestinationPortColumnName],
+            )
+
+            report["queries"] += 1
+            if match is None:
+                report["no_match"] += 1
+                result.update({"Result": "denied", "Row": "", RuleColumnName: "", RuleActionColumnName: ""})
+            else:
+                row, rule_name, rule_action = match
+                permitted = str(rule_action).lower() == "permit"
+                report["permitted" if permitted else "denied"] += 1
+                result.update(
+                    {
+                        "Result": "permitted" if permitted else "denied",
+                        "Row": row,
+                        RuleColumnName: rule_name,
+                        RuleActionColumnName: rule_action,
+                    }
+                )
+            report["results"].append(result)
+
+    return report
+
+
+def check_references(acl_list, catalog, device_os_list):
+    """
+    Check every enabled rule for references which can't be configured, without connecting to a device -
+    undefined or empty zones, undefined address objects, networks which are not configured,
+    undefined applications and applications which are neither ports nor standard applications.
+    Errors are collected for all rules rather than raised on the first one
+
+    :param acl_list: list of AccessRuleClass objects
+    :param catalog: CatalogClass object
+    :param device_os_list: list of Network OS the config is generated for, such as ["junos"]
+    :return: report dictionary - number of rules checked, lists of errors and warnings with sheet row numbers
+    """
+
+    # Only junos needs applications without ports to be standard applications
+    standard_app_registry = get_standard_app_registry(junos_app_definitions) if "junos" in device_os_list else None
+    report = {"rules": 0, "errors": [], "warnings": []}
+    policy_rows = {}
+
+    for acl in acl_list:
+        if acl.Action != ActionEnable:
+            continue
+        report["rules"] += 1
+        findings = []
+
+        policy_name = str(acl.Name).replace(" ", "_").lower()
+        if policy_name == "":
+            findings.append(("errors", RuleColumnName, acl.Name, "rule name is empty"))
+        elif policy_name in policy_rows:
+            findings.append(("errors", RuleColumnName, acl.Name, f"same policy name as row {policy_rows[policy_name]}"))
+        else:
+            policy_rows[policy_name] = acl.Row
+
+        for column_name, zone_name in (
+            (SourceZoneColumnName, acl.SourceZone),
+            (DestinationZoneColumnName, acl.DestinationZone),
+        ):
+            findings.extend(
+                (severity, column_name, zone_name, message) for severity, message in check_zone(zone_name, catalog)
+            )
+
+        for column_name, address_list in (
+            (SourceNetworkColumnName, acl.SourceNetworkAndMask),
+            (DestinationNetworkColumnName, acl.DestinationNetworkAndMask),
+        ):
+            for address in address_list:
+                findings.extend(
+                    (severity, column_name, address, message) for severity, message in check_address(address, catalog)
+                )
+
+        for port_or_app in acl.DestinationPort:
+            findings.extend(
+                (severity, DestinationPortColumnName, port_or_app, message)
+                for severity, message in check_application(port_or_app, acl.Protocol, catalog, standard_app_registry)
+            )
+
+        for severity, column_name, value, message in findings:
+            report[severity].append(
+                {"row": acl.Row, "rule": acl.Name, "column": column_name, "value": value, "message": message}
+            )
+
+    return report
+
+
+def check_zone(zone_name, catalog):
+    # Unknown zone gives an empty zone list in ZoneClass
+    if zone_name not in catalog.Zones:
+        return [("errors", f"zone is not defined in sheet {zones_sheet_name}")]
+    if not [zone for zone in catalog.get_zone_set(zone_name) if zone]:
+        return [("errors", f"zone set is empty in sheet {zones_sheet_name}")]
+    return []
+
+
+def check_address(address, catalog):
+    # Same rules as AddressBookEntryClass uses to configure an address
+
+    if address == "any":
+        return []
+
+    network = parse_address(address)
+    if isinstance(network, ipaddress.IPv4Network):
+        if network.is_global or network.is_private:
+            return []
+        return [("errors", "network is neither private nor global and is not configured")]
+
+    if address not in catalog.AddressBook:
+        return [("errors", f"object is not defined in sheet {address_book_sheet_name}")]
+
+    value = str(catalog.AddressBook[address])
+    if value == "":
+        return [("errors", f"object has no network in sheet {address_book_sheet_name}")]
+    looks_like_network = value.replace(".", "").replace("/", "").isdigit()
+    if looks_like_network and not isinstance(parse_address(value), ipaddress.IPv4Network):
+        # Looks like a network, but isn't valid - it's configured as DNS name
+        return [("warnings", f"object value {value} is not a valid network and is configured as DNS name")]
+    return []
+
+
+def check_application(port_or_app, protocol, catalog, standard_app_registry):
+    # Same rules as ApplicationClass uses to configure an application, "any" too must be in Applications sheet
+
+    port_range = parse_port_range(port_or_app) if port_or_app.replace("-", "").isdigit() else None
+    if port_range:
+        if protocol == "":
+            return [("errors", "protocol is empty")]
+        if not 0 < port_range[0] <= port_range[1] <= 65535:
+            return [("errors", "port or port range is not valid")]
+        return []
+
+    if port_or_app not in catalog.Applications:
+        return [("errors", f"application is not defined in sheet {standard_apps_sheet_name}")]
+
+    app_protocol, app_port = catalog.Applications[port_or_app]
+    if app_protocol in ("tcp", "udp"):
+        if parse_port_range(app_port) in (None, (0, 0)):
+            return [("errors", f"application with protocol {app_protocol} has no port, it would permit all ports")]
+        return []
+    if standard_app_registry is None:
+        return []
+    if standard_app_registry.lookup(app_protocol, 0, port_or_app) is None:
+        return [("errors", f"application with protocol {app_protocol} is configured without port, "
+                           f"but is not a standard application")]
+    return []
+
+
+def print_check_report(report):
+
+    print(f"Enabled rules checked: {report['rules']}, errors: {len(report['errors'])}, "
+          f"warnings: {len(report['warnings'])}")
+
+    for severity in ("errors", "warnings"):
+        for finding in report[severity]:
+            print(
+                f"  {severity[:-1]}: {traffic_flows_sheet_name} row {finding['row']} rule {finding['rule']} "
+                f"column {finding['column']} value {finding['value']}: {finding['message']}"
+            )
+
+
+def print_analysis_report(report):
+
+    print(f"Enabled rules analysed: {report['rules']}")
+
+    print(
+        f"\nShadowed rules - never matched, covered by an earlier rule with a different action: "
+        f"{len(report['shadowed'])}"
+    )
+    for finding in report["shadowed"]:
+        print(
+            f"  {finding['rule']} ({finding['action']}) is covered by "
+            f"{finding['covered_by']} ({finding['covered_by_action']})"
+        )
+
+    print(f"\nRedundant rules - covered by an earlier rule with the same action: {len(report['redundant'])}")
+    for finding in report["redundant"]:
+        print(f"  {finding['rule']} is covered by {finding['covered_by']}")
+
+    print(f"\nMergeable rules - same zones and action: {len(report['mergeable'])}")
+    for group in report["mergeable"]:
+        print(f"  merge {group['merge']} of: {', '.join(group['rules'])}")
+
+
+def print_query_report(report, seconds):
+
+    print(
+        f"Flows looked up: {report['queries']}, permitted: {report['permitted']}, "
+        f"denied: {report['denied'] + report['no_match']} ({report['no_match']} by no matching rule)"
+    )
+    if report["queries"]:
+        print(f"Lookup time: {seconds / report['queries'] * 1000000:.1f} microseconds per flow")
+
+
+def save_query_report(report):
+    """
+    :param report: report dictionary returned by query_flows
+    :return: CSV file name, query columns followed by result, row, rule name and action of the matching rule
+    """
+
+    file_name = f"{output_dir}queries-{datetime.now().strftime('%Y-%m-%d')}.csv"
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    with open(file_name, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=query_columns + ["Result", "Row", RuleColumnName, RuleActionColumnName])
+        writer.writeheader()
+        writer.writerows(report["results"])
+
+    return file_name
+
+
+def save_analysis_report(report):
+    """
+    :param report: report dictionary returned by analyze_rules
+    :return: file name
+    """
+
+    file_name = f"{output_dir}analysis-{datetime.now().strftime('%Y-%m-%d')}.json"
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    with open(file_name, "w") as f:
+        json.dump(report, f, indent=1)
+
+    return file_name
@@ -0,0 +1,245 @@
+import glob
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from pathlib import Path  # OS-agnostic file handling
+
+from analysis_handlers import check_references
+from constdefs import *
+from data_handlers import load_source, stream_source, build_catalog, parse_flows_dataframes, iter_config, write_config
+from renderer_handlers import get_renderer
+
+
+def find_workbooks(pattern):
+    """
+    :param pattern: directory with workbooks, or a glob, such as sites/*.xlsx
+    :return: sorted list of workbook file names
+    """
+
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.xlsx")
+
+    # Excel lock files of open workbooks start with ~$
+    file_names = sorted(name for name in glob.glob(pattern) if not os.path.basename(name).startswith("~$"))
+    if not file_names:
+        print(f"No workbooks found: {pattern}")
+        raise ValueError(f"No workbooks found: {pattern}")
+
+    return file_names
+
+
+def get_output_file_names(source_filename, network_os_list, base_dir=None):
+    """
+    :param source_filename: source workbook
+    :param network_os_list: list of Network OS, such as ["junos"]
+    :param base_dir: directory of all workbooks of a batch, subdirectories below it are part of the name,
+        such as east-fw for base_dir/east/fw.xlsx. If not set, only the workbook name is used
+    :return: output file for each Network OS, named after the workbook
+    """
+    date = datetime.now().strftime("%Y-%m-%d")
+    path = Path(os.path.abspath(source_filename)).with_suffix("")
+    name = "-".join(path.relative_to(base_dir).parts) if base_dir else path.name
+    return [f"{output_dir}{name}-{device_os}-{date}.txt".lower() for device_os in network_os_list]
+
+
+def get_base_dir(source_filenames):
+    """
+    :param source_filenames: list of workbooks
+    :return: deepest directory which contains all workbooks
+    """
+    return os.path.commonpath(
+        [os.path.dirname(os.path.abspath(source_filename)) for source_filename in source_filenames]
+    )
+
+
+def check_output_file_names(source_filenames, network_os_list, base_dir):
+    """
+    Workbooks must not write to the same output file, such as FW.xlsx and fw.xlsx
+
+    :param source_filenames: list of workbooks
+    :param network_os_list: list of Network OS, such as ["junos"]
+    :param base_dir: see get_output_file_names
+    """
+
+    workbooks = {}
+    conflicts = []
+    for source_filename in source_filenames:
+        for file_name in get_output_file_names(source_filename, network_os_list, base_dir):
+            if file_name in workbooks:
+                conflicts.append(f"{workbooks[file_name]} / {source_filename}: {file_name}")
+            workbooks[file_name] = source_filename
+
+    if conflicts:
+        print("Workbooks would be saved to the same output file, rename them:\n  " + "\n  ".join(conflicts))
+        raise ValueError(f"Same output file for workbooks: {', '.join(conflicts)}")
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def build_workbook(
+    source_filename,
+    network_os_list,
+    base_dir=None,
+    check=False,
+    use_cache=True,
+    stream=False,
+    optimize_addresses=False,
+):
+    """
+    Generate config of one workbook. Errors are returned in the result, so other workbooks of a batch are built
+
+    :param source_filename: source workbook
+    :param network_os_list: list of Network OS, such as ["junos", "asa"]
+    :param base_dir: directory of all workbooks of the batch, see get_output_file_names
+    :param check: check references before the config is generated, see check_references
+    :param use_cache: use parsed sheets cached by load_source
+    :param stream: read Traffic Flows row by row, see stream_source
+    :param optimize_addresses: aggregate networks and use address sets, see iter_config
+    :return: result dictionary - workbook, status, number of rules, output files, seconds and error
+    """
+
+    started = time.perf_counter()
+    result = {"workbook": str(source_filename), "status": "failed", "rules": 0, "files": [], "error": ""}
+
+    try:
+        if stream:
+            catalog, action_list, acl_list = stream_source(source_filename)
+        else:
+            traffic_flows_dataframe, address_book_dataframe, zones_dataframe, standard_apps_dataframe = load_source(
+                source_filename, use_cache=use_cache
+            )
+            catalog = build_catalog(address_book_dataframe, zones_dataframe, standard_apps_dataframe)
+            acl_list, action_list = parse_flows_dataframes(traffic_flows_dataframe)
+
+        # Rules are read once per Network OS
+        acl_list = list(acl_list)
+        result["rules"] = len(acl_list)
+
+        if check:
+            report = check_references(acl_list, catalog, network_os_list)
+            if report["errors"]:
+                result["status"] = "check failed"
+                result["error"] = f"{len(report['errors'])} reference errors, first: " + (
+                    f"row {report['errors'][0]['row']} {report['errors'][0]['column']} "
+                    f"{report['errors'][0]['value']}: {report['errors'][0]['message']}"
+                )
+                return result
+
+        file_names = get_output_file_names(source_filename, network_os_list, base_dir)
+        for device_os, file_name in zip(network_os_list, file_names):
+            write_config(
+                iter_config(acl_list, action_list, catalog, device_os, optimize_addresses=optimize_addresses),
+                file_name,
+            )
+            result["files"].append(file_name)
+        result["status"] = "ok"
+
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    finally:
+        result["seconds"] = round(time.perf_counter() - started, 4)
+
+    return result
+
+
+def init_batch_worker(network_os_list):
+    # Renderers load standard applications once per worker, not once per workbook
+    for device_os in network_os_list:
+        get_renderer(device_os)
+
+
+def build_workbook_task(arguments):
+    # Runs in a worker process, see run_batch
+    source_filename, network_os_list, settings = arguments
+    return build_workbook(source_filename, network_os_list, **settings)
+
+
+def run_batch(source_filenames, network_os_list, jobs=1, **settings):
+    """
+    Build workbooks across a pool of worker processes, one workbook per process at a time
+
+    :param source_filenames: list of workbooks
+    :param network_os_list: list of Network OS, such as ["junos"]
+    :param jobs: number of worker processes
+    :param settings: build_workbook options - check, use_cache, stream, optimize_addresses
+    :return: report dictionary - results of each workbook in the given order, numbers of built and failed workbooks
+    """
+
+    started = time.perf_counter()
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    # Workbooks with the same name in different directories are told apart by their directories
+    base_dir = get_base_dir(source_filenames)
+    check_output_file_names(source_filenames, network_os_list, base_dir)
+
+    # Loaded before workers are started, so forked workers share standard applications
+    init_batch_worker(network_os_list)
+
+    tasks = [
+        (source_filename, network_os_list, dict(settings, base_dir=base_dir)) for source_filename in source_filenames
+    ]
+    results = []
+
+    def add_result(result):
+        results.append(result)
+        print(
+            f"  [{len(results)}/{len(tasks)}] {result['workbook']}: {result['status']}, "
+            f"{result['rules']} rules, {result['seconds']:.2f}s {result['error']}".rstrip()
+        )
+
+    if jobs <= 1:
+        for task in tasks:
+            add_result(build_workbook_task(task))
+    else:
+        with multiprocessing.Pool(
+            min(jobs, len(tasks)), initializer=init_batch_worker, initargs=(network_os_list,)
+        ) as pool:
+            for result in pool.imap_unordered(build_workbook_task, tasks):
+                add_result(result)
+
+    order = {source_filename: position for position, source_filename in enumerate(source_filenames)}
+    results.sort(key=lambda result: order[result["workbook"]])
+
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "network_os": network_os_list,
+        "workbooks": len(results),
+        "ok": sum(result["status"] == "ok" for result in results),
+        "failed": sum(result["status"] != "ok" for result in results),
+        "rules": sum(result["rules"] for result in results),
+        "total_seconds": round(time.perf_counter() - started, 4),
+        "results": results,
+    }
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def print_batch_report(report):
+
+    print(
+        f"Workbooks: {report['workbooks']}, built: {report['ok']}, failed: {report['failed']}, "
+        f"rules: {report['rules']}, total time: {report['total_seconds']:.2f}s"
+    )
+    for result in report["results"]:
+        if result["status"] != "ok":
+            print(f"  {result['status']}: {result['workbook']} - {result['error']}")
+
+
+def save_batch_report(report):
+    """
+    :param report: report dictionary returned by run_batch
+    :return: file name
+    """
+
+    file_name = f"{output_dir}batch-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.json"
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    with open(file_name, "w") as f:
+        json.dump(report, f, indent=1)
+
+    return file_name
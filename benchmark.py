@@ -0,0 +1,301 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path  # OS-agnostic file handling
+
+import openpyxl
+
+from constdefs import *
+from data_handlers import load_source, build_catalog, parse_flows_dataframes, iter_config, write_config
+
+zone_names = ["dmz1", "dmz2", "internal1", "internal2", "servers1", "internet-untrust", "mgmt", "partners"]
+stage_names = ["load_source", "build_catalog", "parse_flows_dataframes", "iter_config"]
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def generate_workbook(filename, flows, reuse=0.9, seed=1):
+    """
+    Generate a synthetic source workbook with Traffic Flows, Address Book, Zones and Applications sheets
+
+    :param filename: Excel file to write
+    :param flows: number of rows in Traffic Flows sheet
+    :param reuse: 0 to 1, how often flows share address objects, networks and applications.
+        Number of distinct objects is flows * (1 - reuse), but at least 16
+    :param seed: random seed, the same parameters give the same workbook
+    :return: file name
+    """
+
+    rnd = random.Random(seed)
+    pool_size = max(16, int(flows * (1 - reuse)))
+
+    # Unique networks and ports, taken in order and reused at random
+    networks = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}/32" for i in range(pool_size)]
+    literal_networks = [f"172.{16 + i // 65536 % 16}.{i // 256 % 256}.{i % 256}/32" for i in range(pool_size)]
+    object_names = [f"host-{i}" for i in range(pool_size)]
+    app_names = [f"app-{i}" for i in range(pool_size)]
+    ports = [1024 + i % 60000 for i in range(pool_size)]
+
+    zones = [(name, name) for name in zone_names] + [
+        ("all-internal", "internal1, internal2"),
+        ("all-dmz", "dmz1, dmz2"),
+        ("all-customer", "dmz1, dmz2, internal1, internal2, servers1"),
+    ]
+
+    def get_networks():
+        if rnd.random() < 0.05:
+            return "any"
+        values = []
+        for _ in range(rnd.randint(1, 4)):
+            if rnd.random() < 0.5:
+                values.append(rnd.choice(object_names))
+            else:
+                values.append(rnd.choice(literal_networks))
+        return ", ".join(values)
+
+    def get_ports(protocol):
+        if protocol == "Other":
+            return "icmp-ping"
+        values = []
+        for _ in range(rnd.randint(1, 3)):
+            value = rnd.random()
+            if value < 0.4 and protocol == "TCP":
+                values.append(rnd.choice(app_names))
+            elif value < 0.8:
+                values.append(str(rnd.choice(ports)))
+            else:
+                first_port = rnd.choice(ports)
+                values.append(f"{first_port}-{first_port + rnd.randint(1, 20)}")
+        return ", ".join(values)
+
+    # Write-only mode keeps memory flat for large workbooks
+    workbook = openpyxl.Workbook(write_only=True)
+
+    sheet = workbook.create_sheet(traffic_flows_sheet_name)
+    sheet.append(
+        [
+            RuleColumnName,
+            DescriptionColumnName,
+            SourceZoneColumnName,
+            SourceNetworkColumnName,
+            DestinationZoneColumnName,
+            DestinationNetworkColumnName,
+            ProtocolColumnName,
+            DestinationPortColumnName,
+            RuleActionColumnName,
+            ActionEnable,
+            ActionDelete,
+        ]
+    )
+    for i in range(flows):
+        protocol = rnd.choice(["TCP", "TCP", "UDP", "Other"])
+        sheet.append(
+            [
+                f"Flow {i}",
+                f"Synthetic flow {i}",
+                rnd.choice(zones)[0],
+                get_networks(),
+                rnd.choice(zones)[0],
+                get_networks(),
+                protocol,
+                get_ports(protocol),
+                rnd.choice(["permit", "deny", "reject"]),
+                rnd.choice(["Yes", "Yes", "Yes", "No"]),
+                rnd.choice(["No", "No", "No", "Yes"]),
+            ]
+        )
+
+    sheet = workbook.create_sheet(address_book_sheet_name)
+    sheet.append([AddressBookEntryColumnName, AddressBookNetworkColumnName, "Description"])
+    for name, network in zip(object_names, networks):
+        sheet.append([name, network, ""])
+
+    sheet = workbook.create_sheet(zones_sheet_name)
+    sheet.append([ZoneNameColumnName, ZoneSetColumnName, "Description"])
+    for name, zone_set in zones:
+        sheet.append([name, zone_set, ""])
+
+    sheet = workbook.create_sheet(standard_apps_sheet_name)
+    sheet.append([ApplicationColumnName, ApplicationProtocolColumnName, ApplicationPortColumnName, "Description"])
+    sheet.append(["icmp-ping", "icmp", 0, ""])
+    for name, port in zip(app_names, ports):
+        sheet.append([name, "tcp", port, ""])
+
+    workbook.save(filename)
+    return filename
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def run_stages(source_filename, config_filename):
+    """
+    Run the build pipeline once, yielding after each stage
+
+    :param source_filename: source Excel file
+    :param config_filename: output config file
+    :return: generator of (stage name, stage result)
+    """
+
+    traffic_flows_dataframe, address_book_dataframe, zones_dataframe, standard_apps_dataframe = load_source(
+        source_filename, use_cache=False
+    )
+    yield "load_source", len(traffic_flows_dataframe)
+
+    catalog = build_catalog(address_book_dataframe, zones_dataframe, standard_apps_dataframe)
+    yield "build_catalog", len(catalog.AddressBook)
+
+    acl_list, action_list = parse_flows_dataframes(traffic_flows_dataframe)
+    yield "parse_flows_dataframes", len(acl_list)
+
+    # Config is streamed to the file as it's generated, as fw_build.py does, so both are timed as one stage
+    yield "iter_config", write_config(iter_config(acl_list, action_list, catalog, "junos"), config_filename)
+
+
+def benchmark_workbook(source_filename, config_filename, measure_memory=True):
+    """
+    Time each stage, then run the pipeline again to measure peak memory of each stage.
+    Memory is measured in a separate run, as tracing slows Python code down
+
+    :param source_filename: source Excel file
+    :param config_filename: output config file
+    :param measure_memory: measure peak memory with tracemalloc
+    :return: dictionary stage name -> seconds, peak memory in bytes and stage result, such as number of rules
+    """
+
+    stages = {}
+
+    started = time.perf_counter()
+    for stage_name, stage_result in run_stages(source_filename, config_filename):
+        stages[stage_name] = {"seconds": round(time.perf_counter() - started, 4), "result": stage_result}
+        started = time.perf_counter()
+
+    if measure_memory:
+        tracemalloc.start()
+        for stage_name, stage_result in run_stages(source_filename, config_filename):
+            stages[stage_name]["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        tracemalloc.stop()
+
+    return stages
+
+
+def run_benchmark(sizes, reuse=0.9, seed=1, measure_memory=True, workbook_dir=None):
+    """
+    :param sizes: list of Traffic Flows sizes, such as [1000, 10000]
+    :param reuse: object reuse, see generate_workbook
+    :param seed: random seed
+    :param measure_memory: measure peak memory of each stage
+    :param workbook_dir: directory to keep generated workbooks, temporary directory if not set
+    :return: results dictionary
+    """
+
+    results = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "reuse": reuse,
+        "seed": seed,
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = Path(workbook_dir if workbook_dir else temp_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        for flows in sizes:
+            source_filename = directory / f"benchmark-{flows}-{reuse}-{seed}.xlsx"
+            if not source_filename.exists():
+                print(f"Generating workbook with {flows} flows: {source_filename}")
+                generate_workbook(source_filename, flows, reuse, seed)
+
+            print(f"Running benchmark with {flows} flows")
+            stages = benchmark_workbook(source_filename, Path(temp_dir) / "config.txt", measure_memory)
+            results["runs"].append(
+                {
+                    "flows": flows,
+                    "workbook_bytes": source_filename.stat().st_size,
+                    "total_seconds": round(sum(stage["seconds"] for stage in stages.values()), 4),
+                    "stages": stages,
+                }
+            )
+
+    return results
+
+
+def print_benchmark_results(results):
+
+    print(f"\n{'flows':>8} {'stage':<24} {'seconds':>10} {'peak MB':>10}")
+    for run in results["runs"]:
+        for stage_name in stage_names:
+            stage = run["stages"][stage_name]
+            peak_memory = f"{stage['peak_memory'] / 1024 / 1024:.1f}" if "peak_memory" in stage else "-"
+            print(f"{run['flows']:>8} {stage_name:<24} {stage['seconds']:>10.3f} {peak_memory:>10}")
+        print(f"{run['flows']:>8} {'total':<24} {run['total_seconds']:>10.3f}")
+
+
+def save_benchmark_results(results):
+    """
+    :param results: results dictionary returned by run_benchmark
+    :return: file name
+    """
+
+    file_name = f"{output_dir}benchmark-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.json"
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    with open(file_name, "w") as f:
+        json.dump(results, f, indent=1)
+
+    return file_name
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def parse_args(args=sys.argv[1:]):
+    """Parse arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark config generation with synthetic workbooks")
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000,100000",
+        help="Comma-separated numbers of flows, from 1000 to 500000. Default is 1000,10000,100000",
+    )
+    parser.add_argument(
+        "--reuse",
+        default=0.9,
+        type=float,
+        help="0 to 1, how often flows share address objects, networks and applications. Default is 0.9",
+    )
+    parser.add_argument("--seed", default=1, type=int, help="Random seed for generated workbooks")
+    parser.add_argument(
+        "--no-memory", default=False, action="store_true", help="Only time stages, don't measure peak memory",
+    )
+    parser.add_argument(
+        "--workbook-dir", default=None, help="Keep generated workbooks in a directory and reuse them in later runs",
+    )
+    return parser.parse_args(args)
+
+
+def main():
+    options = parse_args()
+
+    results = run_benchmark(
+        [int(size) for size in options.sizes.split(",")],
+        reuse=options.reuse,
+        seed=options.seed,
+        measure_memory=not options.no_memory,
+        workbook_dir=options.workbook_dir,
+    )
+    print_benchmark_results(results)
+    print("\nResults saved as: " + str(Path(save_benchmark_results(results)).resolve()))
+
+
+if __name__ == "__main__":
+    main()
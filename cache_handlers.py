@@ -0,0 +1,93 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path  # OS-agnostic file handling
+
+from constdefs import *
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def get_file_hash(filename):
+    """
+    :param filename: source Excel file
+    :return: SHA-256 hex digest of the file content
+    """
+
+    file_hash = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+# Snapshot written by another pandas version, or truncated, can fail in many ways when it's read
+corrupt_snapshot_errors = (pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError, TypeError)
+
+
+def get_cache_filename(file_hash, sheet_name):
+    """
+    :param file_hash: content hash of the source file
+    :param sheet_name: sheet name, such as Traffic Flows
+    :return: snapshot file name, which includes cache format and pandas versions
+    """
+
+    import pandas as pd
+
+    return f"{cache_dir}{file_hash}-{sheet_name.replace(' ', '_')}-v{cache_format_version}-pandas{pd.__version__}.pkl"
+
+
+def load_cached_sheet(file_hash, sheet_name):
+    """
+    :param file_hash: content hash of the source file
+    :param sheet_name: sheet name, such as Traffic Flows
+    :return: dataframe, or None if the sheet is not cached
+    """
+
+    import pandas as pd
+
+    cache_filename = get_cache_filename(file_hash, sheet_name)
+    try:
+        dataframe = pd.read_pickle(cache_filename)
+    except FileNotFoundError:
+        return None
+    except corrupt_snapshot_errors as e:
+        print(f"Cached sheet {cache_filename} can't be read, the source file is parsed again: {type(e).__name__}")
+        try:
+            os.remove(cache_filename)
+        except FileNotFoundError:
+            pass
+        return None
+
+    # Mark as recently used, so eviction removes older snapshots first
+    os.utime(cache_filename)
+    return dataframe
+
+
+def save_cached_sheet(file_hash, sheet_name, dataframe):
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    cache_filename = get_cache_filename(file_hash, sheet_name)
+
+    # Write to a temporary file first, so concurrent runs never read a partial snapshot
+    temp_filename = f"{cache_filename}.{os.getpid()}.tmp"
+    dataframe.to_pickle(temp_filename)
+    os.replace(temp_filename, cache_filename)
+
+    evict_cache()
+
+
+def evict_cache(max_entries=cache_max_entries):
+    """
+    Remove least recently used snapshots above max_entries
+
+    :param max_entries: number of sheet snapshots to keep
+    """
+
+    snapshots = sorted(Path(cache_dir).glob("*.pkl"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for snapshot in snapshots[max_entries:]:
+        try:
+            snapshot.unlink()
+        except FileNotFoundError:
+            pass
@@ -1,38 +1,203 @@
+import collections
+import functools
 import ipaddress
 import json
+import os
+import sys
 
 from constdefs import *
+from profile_handlers import count
 
 
-# --------------------------------------- Classes - ZoneClass ---------------------------------------
-class ZoneClass:
-    def __init__(self, zones_dataframe, SourceZone="", DestinationZone=""):
-        self.SourceZones = []
-        self.DestinationZones = []
+def parse_network(value):
+    # Networks are parsed in one place, so parsing can be counted with --profile
+    count("ipaddress parses")
+    return ipaddress.IPv4Network(value)
+
+
+def intern_value(value):
+    # Zones, protocols, networks and applications repeat in many rules, keep one copy of each string
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+# Immutable entries of ApplicationClass and AddressBookEntryClass
+ApplicationEntry = collections.namedtuple("ApplicationEntry", ["Name", "Protocol", "DestinationPort"])
+AddressEntry = collections.namedtuple("AddressEntry", ["name", "value", "direction", "members"], defaults=[None])
+
+
+# --------------------------------------- Standard Applications Registry ---------------------------------------
+def parse_port_range(port):
+    """
+    :param port: port number or range, such as 443, "443" or "555-558"
+    :return: (first port, last port) tuple, or None if value is not a port or a range
+    """
+    part = str(port).split("-")
+    try:
+        if len(part) == 1:
+            return int(part[0]), int(part[0])
+        elif len(part) == 2:
+            return int(part[0]), int(part[1])
+    except ValueError:
+        pass
+    return None
+
+
+class StandardAppRegistryClass:
+
+    """ Applications pre-defined in Network OS, such as junos-https,
+    indexed by (protocol, port range) and by name
+    """
+
+    def __init__(self, standard_app_definitions):
+        # Keep position of each application, so the first matching definition wins as in the source file
+        self.ByPort = {}
+        self.ByName = {}
+
+        for position, app in enumerate(standard_app_definitions):
+            port_range = parse_port_range(app["destination-port"])
+            if port_range:
+                self.ByPort.setdefault((app["protocol"], port_range), (position, app["name"]))
+            self.ByName.setdefault(app["name"], position)
+
+    def lookup(self, protocol, destination_port, name):
+        """
+        :param protocol: Application protocol, such as tcp
+        :param destination_port: port number or range
+        :param name: Application name, used for port 0 - no TCP or UDP protocol
+        :return: Standard application name, or None if not found
+        """
+        port_range = parse_port_range(destination_port)
+        if port_range is None:
+            return None
+
+        found = self.ByPort.get((protocol, port_range))
+        if port_range == (0, 0) and name in self.ByName:
+            if found is None or self.ByName[name] < found[0]:
+                return name
+        return found[1] if found else None
+
+
+_standard_app_registries = {}
+
+
+def get_standard_app_registry(filename=junos_app_definitions, refresh=False):
+    """
+    Load standard applications once per process, reload only if the file has changed
 
-        source_zones = zones_dataframe.loc[zones_dataframe[ZoneNameColumnName] == SourceZone][
-            ZoneSetColumnName
-        ].items()
+    :param filename: JSON file with standard applications
+    :param refresh: force reload
+    :return: StandardAppRegistryClass object
+    """
+    mtime = os.stat(filename).st_mtime_ns
+    cached = _standard_app_registries.get(filename)
+
+    if refresh or cached is None or cached[0] != mtime:
+        count("standard app file loads")
+        with open(filename, "r") as f:
+            cached = (mtime, StandardAppRegistryClass(json.load(f)))
+        _standard_app_registries[filename] = cached
 
-        destination_zones = zones_dataframe.loc[zones_dataframe[ZoneNameColumnName] == DestinationZone][
-            ZoneSetColumnName
-        ].items()
+    return cached[1]
 
-        for index, value in source_zones:
-            self.SourceZones = list(value.replace(",", "").split(" "))
 
-        for index, value in destination_zones:
-            self.DestinationZones = list(value.replace(",", "").split(" "))
+# --------------------------------------- Classes - CatalogClass ---------------------------------------
+class CatalogClass:
+
+    """ Compiled reference catalogs - Zones, Applications and Address Book sheets indexed by name.
+    Built once per run, so every rule resolves its zones, applications and address objects in O(1)
+    """
+
+    def __init__(self, zones=(), applications=(), address_book=()):
+        """
+        :param zones: iterable of (Zone Name, Zone Set) pairs
+        :param applications: iterable of (Application, Protocol, Port) tuples
+        :param address_book: iterable of (Object Name, Network) pairs
+        """
+
+        self.Zones = {}
+        self.Applications = {}
+        self.AddressBook = {}
+
+        duplicates = []
+
+        for name, zone_set in zones:
+            if name == "":
+                continue
+            if name in self.Zones:
+                duplicates.append(f"{zones_sheet_name}: {name}")
+            self.Zones[name] = list(zone_set.replace(",", "").split(" "))
+
+        for name, protocol, port in applications:
+            if name == "":
+                continue
+            if name in self.Applications:
+                duplicates.append(f"{standard_apps_sheet_name}: {name}")
+            self.Applications[name] = (protocol, port)
+
+        for name, network in address_book:
+            if name == "":
+                continue
+            if name in self.AddressBook:
+                duplicates.append(f"{address_book_sheet_name}: {name}")
+            self.AddressBook[name] = network
+
+        if duplicates:
+            print("Names must be unique, found duplicate entries:\n  " + "\n  ".join(duplicates))
+            raise ValueError(f"Duplicate catalog entries: {', '.join(duplicates)}")
+
+    def get_zone_set(self, zone_name):
+        """
+        :param zone_name: Zone Name as defined in Zones sheet
+        :return: list of zones in the zone set, empty list if zone is not defined
+        """
+        count("catalog lookups")
+        return list(self.Zones.get(zone_name, []))
+
+    def get_application(self, app_name):
+        """
+        :param app_name: Application name as defined in Applications sheet
+        :return: (protocol, port) tuple
+        """
+        count("catalog lookups")
+        try:
+            return self.Applications[app_name]
+        except KeyError:
+            raise ValueError(f"Application {app_name} not found") from None
+
+    def get_address(self, object_name):
+        """
+        :param object_name: Object Name as defined in Address Book sheet
+        :return: Network or DNS name of the object
+        """
+        count("catalog lookups")
+        try:
+            return self.AddressBook[object_name]
+        except KeyError:
+            raise ValueError(
+                f"Object {object_name} not found in sheet {address_book_sheet_name} column {AddressBookEntryColumnName}"
+            ) from None
+
+
+# --------------------------------------- Classes - ZoneClass ---------------------------------------
+class ZoneClass:
+
+    __slots__ = ("SourceZones", "DestinationZones")
+
+    def __init__(self, catalog, SourceZone="", DestinationZone=""):
+        self.SourceZones = catalog.get_zone_set(SourceZone)
+        self.DestinationZones = catalog.get_zone_set(DestinationZone)
 
 
 # --------------------------------------- Classes - ApplicationClass ---------------------------------------
 class ApplicationClass:
+
+    __slots__ = ("DestinationPortList",)
+
     def __init__(
-            self, standard_apps_dataframe, Protocol="", DestinationPortList="", Description=""
+            self, catalog, Protocol="", DestinationPortList="", Description=""
     ):
 
         # self.SourcePort = SourcePort if SourcePort else ""
-        self.DestinationPortLis = []
 
         dest_port_list = []
 
@@ -56,9 +221,7 @@ class ApplicationClass:
                 # Not digit and not range
                 try:
                     # try to locate an App based on name from App sheet
-                    app_protocol = standard_apps_dataframe.loc[
-                        standard_apps_dataframe[ApplicationColumnName] == port_or_app
-                        ][ApplicationProtocolColumnName].item()
+                    app_protocol, app_port = catalog.get_application(port_or_app)
                 except ValueError as e:
                     print(
                         f"Check if application {port_or_app} is defined in sheet {standard_apps_sheet_name} column {ApplicationColumnName} and its name is unique"
@@ -66,83 +229,46 @@ class ApplicationClass:
                     print(f"Exception:{e}\n\n Exiting")
                     raise e
                     exit(1)
-                if app_protocol == ("tcp" or "udp"):
+                if app_protocol in ("tcp", "udp"):
                     # TODO: if app_protocol not in DrodDownFieldNonStandartProtocol
-                    app_dest_port = standard_apps_dataframe.loc[
-                        standard_apps_dataframe[ApplicationColumnName] == port_or_app
-                        ][ApplicationPortColumnName].item()
-                    app_name = f"{Protocol.lower()}-{port_or_app}"
+                    app_dest_port = app_port
+                    app_name = f"{app_protocol}-{port_or_app}"
                 else:
                     app_name = f"{port_or_app}"
                     app_dest_port = 0
                     # app_protocol = DrodDownFieldNonStandartProtocol
 
-            dest_port_list.append(
-                {"Name": app_name, "Protocol": app_protocol, "DestinationPort": app_dest_port, }
-            )
-        self.DestinationPortList = dest_port_list
+            dest_port_list.append(ApplicationEntry(app_name, app_protocol, app_dest_port))
+        self.DestinationPortList = tuple(dest_port_list)
 
-    # ----------------------------------------------------------------
-    def check_standard_app(self, acl_app, standard_app_definitions):
-        """
-        Check if Application in ACL is already defined in Network OS
-        :param acl_app: Application object to check
-        :param standard_app_definitions:
-        :return: if found - Standart application name, such as junos-bgp, or None if not found
-        """
-
-        if "-" not in str(acl_app["DestinationPort"]):
-            for app in standard_app_definitions:
-                if (
-                        # match app by protocl and port number
-                        int(app["destination-port"]) == int(acl_app["DestinationPort"])
-                        and app["protocol"] == acl_app["Protocol"]
-                ) or (
-                        # Port 0, so no TCP or UDP protocol, match by name
-                        int(acl_app["DestinationPort"]) == 0
-                        and app["name"] == acl_app["Name"]
-                ):
-                    return app["name"]
-        return None
-
-    # ----------------------------------------------------------------
-    def convert_to_device_format(self, device_type):
-        """
-        Converts Application object to specific device config
-
-        :param device_type: Network OS, such as junos
-        :return: actual device config as a single string
-        """
-
-        result_string = ""
-        if device_type == "junos":
 
-            with open(junos_app_definitions, "r") as f:
-                standard_app_definitions = json.load(f)
-
-            # For every destination port in ACL check if a it's a standard application in device
-            for item in self.DestinationPortList:
-
-                app_name = self.check_standard_app(item, standard_app_definitions)
-
-                if app_name:
-                    item["Name"] = app_name
-                else:
-                    prefix = f"set applications application {item['Name']} protocol {item['Protocol']} destination-port {item['DestinationPort']}".lower()
-                    result_string += "\n" + prefix
+# --------------------------------------- Classes - AddressBookEntryClass ---------------------------------------
 
-        return result_string.lower()
 
+@functools.lru_cache(maxsize=65536)
+def get_network_entry(address, direction):
+    """
+    Entries for networks are immutable and shared by all rules using the same network
 
-# --------------------------------------- Classes - AddressBookEntryClass ---------------------------------------
+    :param address: network, such as 10.1.2.0/24
+    :param direction: source or destination
+    :return: AddressEntry object, or None if the network is neither private nor global and is not configured
+    :raises ValueError: if address is not a network
+    """
+    network = parse_network(address)
+    if network.is_global or network.is_private:
+        return AddressEntry("net-" + address.replace("/", "_"), address, direction)
+    return None
 
 
 class AddressBookEntryClass:
 
+    __slots__ = ("Description", "AddressBook")
+
     name = ""
 
     def __init__(
-        self, address_book_dataframe, Name="", Description="", SourceNetwork="", DestinationNetwork="",
+        self, catalog, Name="", Description="", SourceNetwork="", DestinationNetwork="",
     ):
 
         address_book_dict = {}
@@ -152,48 +278,26 @@ class AddressBookEntryClass:
 
         for address in SourceNetwork:
             try:
-                if ipaddress.IPv4Network(address).is_global or ipaddress.IPv4Network(address).is_private:
-                    address_book_list.append(
-                        {"name": "net-" + address.replace("/", "_"), "value": address, "direction": "source"}
-                    )
+                network_entry = get_network_entry(address, "source")
+                if network_entry:
+                    address_book_list.append(network_entry)
             except ValueError:
                 if address == "any":
-                    address_book_list = [{"name": "any", "value": "any", "direction": "source"}]
+                    address_book_list = [AddressEntry("any", "any", "source")]
                 else:
-                    address_book_list.append(
-                        {
-                            "name": address,
-                            "value": address_book_dataframe.loc[
-                                address_book_dataframe[AddressBookEntryColumnName] == address
-                            ][AddressBookNetworkColumnName].item(),
-                            "direction": "source",
-                        }
-                    )
+                    address_book_list.append(AddressEntry(address, catalog.get_address(address), "source"))
 
         # -------------- Parse DestinationNetwork
         for address in DestinationNetwork:
             try:
-                if ipaddress.IPv4Network(address).is_global or ipaddress.IPv4Network(address).is_private:
-                    address_book_list.append(
-                        {
-                            "name": "net-" + address.replace("/", "_"),
-                            "value": address,
-                            "direction": "destination",
-                        }
-                    )
+                network_entry = get_network_entry(address, "destination")
+                if network_entry:
+                    address_book_list.append(network_entry)
             except ValueError:
                 if address == "any":
-                    address_book_list.append({"name": "any", "value": "any", "direction": "destination"})
+                    address_book_list.append(AddressEntry("any", "any", "destination"))
                 else:
-                    address_book_list.append(
-                        {
-                            "name": address,
-                            "value": address_book_dataframe.loc[
-                                address_book_dataframe[AddressBookEntryColumnName] == address
-                            ][AddressBookNetworkColumnName].item(),
-                            "direction": "destination",
-                        }
-                    )
+                    address_book_list.append(AddressEntry(address, catalog.get_address(address), "destination"))
 
         address_book_dict["name"] = "addr_book_" + Name.lower().replace(" ", "_")
         address_book_dict["items"] = address_book_list
@@ -201,37 +305,103 @@ class AddressBookEntryClass:
         self.Description = Description
         self.AddressBook = address_book_dict
 
-    def convert_to_device_format(self, device_type):
+    def aggregate_networks(self):
+        """
+        Collapse adjacent and overlapping networks entered as CIDR into the smallest list of supernets, per direction.
+        Named objects and any are kept as is
+        """
+
+        for direction in ("source", "destination"):
+            items = [item for item in self.AddressBook["items"] if item.direction == direction]
+            literal_items = [item for item in items if item.name == "net-" + item.value.replace("/", "_")]
+            if len(literal_items) < 2:
+                continue
+
+            networks = [parse_network(item.value) for item in literal_items]
+            aggregated_networks = []
+            for supernet in ipaddress.collapse_addresses(networks):
+                # Keep original networks if the supernet is neither private nor global, it wouldn't be configured
+                if supernet.is_global or supernet.is_private:
+                    aggregated_networks.append(supernet)
+                else:
+                    aggregated_networks.extend(network for network in networks if network.subnet_of(supernet))
 
-        address_book_entry_command = []
+            aggregated_items = [
+                AddressEntry("net-" + str(network).replace("/", "_"), str(network), direction)
+                for network in dict.fromkeys(aggregated_networks)
+            ]
 
-        if device_type == "junos":
-            for item in self.AddressBook["items"]:
-                try:
-                    if (
-                        ipaddress.IPv4Network(item["value"]).is_global
-                        or ipaddress.IPv4Network(item["value"]).is_private
-                    ):
-                        address_book_entry_command.append(
-                            f"set security address-book global address " f"{item['name']} " f"{item['value']}"
-                        )
-                except ValueError:
-                    if item["name"] != "any":
-                        address_book_entry_command.append(
-                            f"set security address-book global address "
-                            f"{item['name']} "
-                            f"dns-name {item['value']}"
-                        )
-
-        result_string = "\n".join(str(x) for x in address_book_entry_command)
-        return result_string.lower()
+            # Aggregated networks take the place of the first network entered as CIDR
+            position = items.index(literal_items[0])
+            items = [item for item in items if item not in literal_items]
+            items[position:position] = aggregated_items
+
+            self.AddressBook["items"] = [
+                item for item in self.AddressBook["items"] if item.direction != direction
+            ] + items
+
+    def get_address_groups(self):
+        """
+        :return: dictionary direction -> sorted tuple of object names, for directions with more than one object
+        """
+
+        address_groups = {}
+        for direction in ("source", "destination"):
+            names = sorted(
+                {str(item.name).lower() for item in self.AddressBook["items"] if item.direction == direction}
+            )
+            if len(names) > 1 and "any" not in names:
+                address_groups[direction] = tuple(names)
+        return address_groups
+
+    def use_address_sets(self, address_sets):
+        """
+        Replace a group of objects with an address set, if the same group is used by other rules
+
+        :param address_sets: dictionary sorted tuple of object names -> address set name
+        """
+
+        for direction, address_group in self.get_address_groups().items():
+            if address_group not in address_sets:
+                continue
+
+            members = [item for item in self.AddressBook["items"] if item.direction == direction]
+            self.AddressBook["items"] = [
+                item for item in self.AddressBook["items"] if item.direction != direction
+            ] + [AddressEntry(address_sets[address_group], "", direction, tuple(members))]
+
+
+def split_field(value):
+    """
+    :param value: comma-separated string from Traffic Flows sheet, such as "https, 555-558"
+    :return: tuple of interned values with spaces removed
+    """
+    if value == "any":
+        return ("any",)
+    return tuple(sys.intern(item) for item in str(value).replace(" ", "").split(","))
 
 
 class AccessRuleClass:
 
     """ ACL Object.
+    Slotted, as hundreds of thousands of rules can be kept in memory
     """
 
+    __slots__ = (
+        "Name",
+        "Description",
+        "Action",
+        "SourceZone",
+        "DestinationZone",
+        "RuleAction",
+        "Protocol",
+        "Row",
+        "SourceNetworkAndMask",
+        "DestinationNetworkAndMask",
+        "DestinationPort",
+        "Changed",
+    )
+
     def __init__(
         self,
         Name="",
@@ -245,103 +415,65 @@ class AccessRuleClass:
         DestinationNetwork="",
         DestinationPort="",
         RuleAction="",
+        Row=None,
+        Changed=False,
     ):
         """Return a ACL object, Initialize with empty values"""
 
         self.Name = Name
         self.Description = Description
-        self.Action = Action
-        self.SourceZone = SourceZone
-        self.DestinationZone = DestinationZone
-        self.RuleAction = RuleAction
-        self.Protocol = Protocol
-
-        self.SourceNetworkAndMask = []
-        self.DestinationNetworkAndMask = []
+        self.Action = intern_value(Action)
+        self.SourceZone = intern_value(SourceZone)
+        self.DestinationZone = intern_value(DestinationZone)
+        self.RuleAction = intern_value(RuleAction)
+        self.Protocol = intern_value(Protocol)
+        #  Row number in Traffic Flows sheet, to report errors
+        self.Row = Row
+        #  Changed since the previous incremental run, match conditions on the device are replaced, see diff_rules
+        self.Changed = Changed
+
+        #  Comma-separated values, split row by row, "any" is kept as a single value
+        self.SourceNetworkAndMask = split_field(SourceNetwork)
+        self.DestinationNetworkAndMask = split_field(DestinationNetwork)
         #  self.SourcePort = []
-        self.DestinationPort = []
-
-        #  if Source Network is "any" then Source Network Mask should be empty
-        if SourceNetwork == "any":
-            self.SourceNetworkAndMask.append("any")
-        else:
-            source_address_list = SourceNetwork.replace(" ", "").split(",")
-            for source_address in source_address_list:
-                self.SourceNetworkAndMask.append(source_address)
-
-        # if Destination Network is "any" then Destination Network Mask should be empty
-        if DestinationNetwork == "any":
-            self.DestinationNetworkAndMask.append("any")
-        else:
-            destination_address_list = DestinationNetwork.replace(" ", "").split(",")
-            for destination_address in destination_address_list:
-                self.DestinationNetworkAndMask.append(destination_address)
-
-        # if Destination Network is "any" then Destination Network Mask should be empty
-        if DestinationPort == "any":
-            self.DestinationPort.append("any")
-        else:
-            destination_port_list = str(DestinationPort).replace(" ", "").split(",")
-            for destination_port in destination_port_list:
-                self.DestinationPort.append(destination_port)
-
-    def convert_to_device_format(
-        self, device_type, application_definition, address_book_definition, zones_definition,
-    ):
-        """
+        self.DestinationPort = split_field(DestinationPort)
+
+
+# --------------------------------------- Classes - ResolvedRuleClass ---------------------------------------
+class ResolvedRuleClass:
 
-        :param device_type:
-        :return:
+    """ Vendor-neutral rule - zones, address book entries and applications resolved through the catalog.
+    Built once per rule and rendered by a renderer of each Network OS, see renderer_handlers
+    """
+
+    __slots__ = (
+        "Name",
+        "Description",
+        "Action",
+        "RuleAction",
+        "SourceZones",
+        "DestinationZones",
+        "Addresses",
+        "Applications",
+        "Changed",
+    )
+
+    def __init__(self, acl, application_definition=None, address_book_definition=None, zones_definition=None):
+        """
+        :param acl: AccessRuleClass object
+        :param application_definition: ApplicationClass object, only for rules to enable
+        :param address_book_definition: AddressBookEntryClass object, only for rules to enable
+        :param zones_definition: ZoneClass object, only for rules to enable
         """
 
-        source_address_book_entries = []
-        destination_address_book_entries = []
-        application_entries = []
-
-        if device_type == "junos":
-
-            if self.Action == ActionDelete:
-                result_string = f"\ndelete security policies global" f" policy {self.Name.replace(' ', '_')} "
-                return result_string.lower()
-
-            elif self.Action == ActionDeactivate:
-                result_string = (
-                    f"\ndeactivate security policies global" f" policy {self.Name.replace(' ', '_')} "
-                )
-                return result_string.lower()
-
-            elif self.Action == ActionEnable:
-                for item in address_book_definition.AddressBook["items"]:
-
-                    if item["direction"] == "source":
-                        source_address_book_entries.append(item["name"])
-                    elif item["direction"] == "destination":
-                        destination_address_book_entries.append(item["name"])
-
-                for item in application_definition.DestinationPortList:
-                    application_entries.append(item["Name"])
-
-                result_string = (
-                    f"set security policies global"
-                    f" policy {self.Name.replace(' ', '_')} "
-                    f' description "{self.Description}"'
-                    f" match"
-                    f" from-zone [{' '.join(zones_definition.SourceZones)}]"
-                    f" to-zone [{' '.join(zones_definition.DestinationZones)}]"
-                    f" source-address [{' '.join(str(x) for x in source_address_book_entries)}]"
-                    f" destination-address [{' '.join(str(x) for x in destination_address_book_entries)}]"
-                    f" application [{' '.join(str(x) for x in application_entries)}]"
-                    f"\nset security policies global"
-                    f" policy {self.Name.replace(' ', '_')}"
-                    f" then {self.RuleAction}"
-                    f"\nactivate security policies global"
-                    f" policy {self.Name.replace(' ', '_')}"
-                )
-
-        elif device_type == "Cisco ASA":
-            # placeholder
-            return "Not yet implemented"
-        else:
-            return "Not yet implemented"
-
-        return result_string.lower()
+        self.Name = acl.Name
+        self.Description = acl.Description
+        self.Action = acl.Action
+        self.RuleAction = acl.RuleAction
+        self.Changed = acl.Changed
+
+        self.SourceZones = tuple(zones_definition.SourceZones) if zones_definition else ()
+        self.DestinationZones = tuple(zones_definition.DestinationZones) if zones_definition else ()
+        # AddressEntry objects of both directions, in the order they are configured
+        self.Addresses = tuple(address_book_definition.AddressBook["items"]) if address_book_definition else ()
+        self.Applications = application_definition.DestinationPortList if application_definition else ()
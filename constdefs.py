@@ -45,3 +45,19 @@ virtual_srx = {
     "verbose": "True",
 }
 junos_app_definitions = "junos-standard-apps.json"
+
+# Config push to test devices
+device_file_system = "/var/tmp"
+config_batch_size = 500
+
+# Rendered rules kept in memory before spilling to a temporary file, in characters
+spool_max_size = 16 * 1024 * 1024
+spool_read_size = 1024 * 1024
+
+# Rules sent to a worker process at once, see --jobs
+render_shard_size = 500
+
+cache_dir = "cache/"
+cache_max_entries = 64
+# Increase when the cached dataframes change, so snapshots of older versions are not read
+cache_format_version = 1
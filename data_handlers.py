@@ -1,146 +1,598 @@
-import numpy as np
-import pandas as pd
+import collections
+import hashlib
+import itertools
+import multiprocessing
+import os
+import sys
+import tempfile
 
+from cache_handlers import get_file_hash, load_cached_sheet, save_cached_sheet
 from classdefs import (
     AccessRuleClass,
     ApplicationClass,
     AddressBookEntryClass,
+    CatalogClass,
+    ResolvedRuleClass,
     ZoneClass,
+    get_standard_app_registry,
 )
 from constdefs import *
+from profile_handlers import count
+from renderer_handlers import get_renderer
 
 
 # -------------------------------------------------------------------------------------------
 
 
-def load_source(filename):
-    # Load data from various Excel tabs into dataframes
-    xl = pd.ExcelFile(filename)
+def load_source(filename, use_cache=True):
+    """
+    Load data from various Excel tabs into dataframes.
+    Parsed sheets are cached by file content, so an unchanged workbook is not parsed again
+
+    :param filename: source Excel file
+    :param use_cache: read and update parsed sheets cache
+    :return: Traffic Flows, Address Book, Zones and Applications dataframes
+    """
 
-    temp_df1 = xl.parse(traffic_flows_sheet_name)
-    # Replace empty values with empty stings to avoid errors in processing data as strings
-    traffic_flows_dataframe = temp_df1.replace(np.nan, "", regex=True)
+    sheet_names = [traffic_flows_sheet_name, address_book_sheet_name, zones_sheet_name, standard_apps_sheet_name]
+    dataframes = {}
 
-    temp_df2 = xl.parse(address_book_sheet_name)
-    address_book_dataframe = temp_df2.replace(np.nan, "", regex=True)
+    file_hash = get_file_hash(filename) if use_cache else None
+    if use_cache:
+        for sheet_name in sheet_names:
+            dataframes[sheet_name] = load_cached_sheet(file_hash, sheet_name)
 
-    temp_df3 = xl.parse(zones_sheet_name)
-    zones_dataframe = temp_df3.replace(np.nan, "", regex=True)
+    missing_sheets = [sheet_name for sheet_name in sheet_names if dataframes.get(sheet_name) is None]
+    if missing_sheets:
+        # Imported only when a workbook is parsed, as they take most of the start time
+        import numpy as np
+        import pandas as pd
 
-    temp_df4 = xl.parse(standard_apps_sheet_name)
-    standard_apps_dataframe = temp_df4.replace(np.nan, "", regex=True)
+        xl = pd.ExcelFile(filename)
+
+        for sheet_name in missing_sheets:
+            # Replace empty values with empty stings to avoid errors in processing data as strings
+            dataframes[sheet_name] = xl.parse(sheet_name).replace(np.nan, "", regex=True)
+            if use_cache:
+                save_cached_sheet(file_hash, sheet_name, dataframes[sheet_name])
 
     # print(Fore.GREEN + f"--------------- Loaded Data Sources -------------------")
     # print(f"records found in {traffic_flows_sheet_name} sheet: {str(len(traffic_flows_dataframe[RuleColumnName]))}")
 
-    return traffic_flows_dataframe, address_book_dataframe, zones_dataframe, standard_apps_dataframe
+    return tuple(dataframes[sheet_name] for sheet_name in sheet_names)
 
 
 # -------------------------------------------------------------------------------------------
 
 
-def parse_flows_dataframes(traffic_flows_dataframe):
+def stream_source(filename):
+    """
+    Constant-memory alternative to load_source and parse_flows_dataframes for very large workbooks.
+    Reference sheets are compiled into a catalog, Traffic Flows rows are read one by one in read-only mode
+    and returned as a lazy stream of rules
 
-    action_list = []
+    :param filename: source Excel file
+    :return: (CatalogClass object, action list, generator of AccessRuleClass objects)
+    """
 
-    # Get Headers from the dataframe and search for Action header - Active/Delete/etc
-    headers_list = list(traffic_flows_dataframe.columns.values)
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+
+    catalog = build_catalog_from_rows(
+        {
+            sheet_name: workbook[sheet_name].iter_rows(values_only=True)
+            for sheet_name in (address_book_sheet_name, zones_sheet_name, standard_apps_sheet_name)
+        }
+    )
+
+    flows_headers = next(workbook[traffic_flows_sheet_name].iter_rows(max_row=1, values_only=True), ())
+    action_list = get_action_list([str(header) for header in flows_headers if header is not None])
+
+    def iter_rules():
+        rows = select_columns(workbook[traffic_flows_sheet_name].iter_rows(values_only=True), flow_column_names)
+        try:
+            # Header is the first row
+            for row_number, row in enumerate(rows, 2):
+                acl = parse_flow_row(row, row_number)
+                if acl is not None:
+                    yield acl
+        finally:
+            workbook.close()
+
+    return catalog, action_list, iter_rules()
+
+
+# Traffic Flows columns in the order parse_flow_row takes them
+flow_column_names = [
+    RuleColumnName,
+    DescriptionColumnName,
+    ProtocolColumnName,
+    SourceZoneColumnName,
+    SourceNetworkColumnName,
+    DestinationZoneColumnName,
+    DestinationNetworkColumnName,
+    DestinationPortColumnName,
+    RuleActionColumnName,
+    ActionEnable,
+    ActionDelete,
+]
+
+
+def select_columns(rows, column_names):
+    """
+    :param rows: iterable of sheet row tuples, headers first, such as openpyxl iter_rows output
+    :param column_names: columns to return
+    :return: generator of tuples of the requested columns, empty cells as empty strings
+    """
+    rows = iter(rows)
+    headers_list = list(next(rows, ()))
+    indexes = [headers_list.index(column_name) for column_name in column_names]
+
+    for row in rows:
+        yield tuple("" if row[i] is None else row[i] for i in indexes)
+
+
+def build_catalog_from_rows(sheet_rows):
+    """
+    Same as build_catalog, for sheets read as rows
+
+    :param sheet_rows: dictionary sheet name -> iterable of row tuples, headers first
+    :return: CatalogClass object
+    """
+
+    return CatalogClass(
+        zones=select_columns(sheet_rows[zones_sheet_name], [ZoneNameColumnName, ZoneSetColumnName]),
+        applications=select_columns(
+            sheet_rows[standard_apps_sheet_name],
+            [ApplicationColumnName, ApplicationProtocolColumnName, ApplicationPortColumnName],
+        ),
+        address_book=select_columns(
+            sheet_rows[address_book_sheet_name], [AddressBookEntryColumnName, AddressBookNetworkColumnName]
+        ),
+    )
+
+
+def parse_flow_row(row, row_number):
+    """
+    :param row: tuple of flow_column_names values
+    :param row_number: Traffic Flows sheet row number
+    :return: AccessRuleClass object, None if the row has no action
+    """
+
+    (name, description, protocol, source_zone, source_network, destination_zone,
+     destination_network, destination_port, rule_action, enable, delete) = row
+
+    if delete == "Yes":
+        action = ActionDelete
+    elif delete == "No" and enable == "Yes":
+        action = ActionEnable
+    elif delete == "No" and enable == "No":
+        action = ActionDeactivate
+    else:
+        return None
+
+    return AccessRuleClass(
+        name,
+        description,
+        action,
+        protocol,
+        source_zone,
+        source_network,
+        destination_zone,
+        destination_network,
+        destination_port,
+        rule_action,
+        row_number,
+    )
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def build_catalog(address_book_dataframe, zones_dataframe, standard_apps_dataframe):
+    """
+    Compile reference sheets into hash indexes, so rules are resolved without scanning dataframes
 
+    :param address_book_dataframe:
+    :param zones_dataframe:
+    :param standard_apps_dataframe:
+    :return: CatalogClass object
+    """
+
+    return CatalogClass(
+        zones=zip(zones_dataframe[ZoneNameColumnName], zones_dataframe[ZoneSetColumnName]),
+        applications=zip(
+            standard_apps_dataframe[ApplicationColumnName],
+            standard_apps_dataframe[ApplicationProtocolColumnName],
+            standard_apps_dataframe[ApplicationPortColumnName],
+        ),
+        address_book=zip(
+            address_book_dataframe[AddressBookEntryColumnName], address_book_dataframe[AddressBookNetworkColumnName]
+        ),
+    )
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def get_action_list(headers_list):
+    """
+    :param headers_list: Traffic Flows sheet headers
+    :return: list of actions - Enable/Delete/Deactivate, in the order config is generated
+    """
+
+    action_list = []
+
+    # Search for Action header - Active/Delete/etc
     for header in headers_list:
         if (ActionEnable in header) or (ActionDelete in header):
             action_list.append(header)
     # Special case when Action is Enabled and set to No - deactivate
     action_list.append(ActionDeactivate)
 
-    # Process dataframe
+    return action_list
+
+
+def parse_flows_dataframes(traffic_flows_dataframe):
+    import numpy as np
+    import pandas as pd
+
+    # Get Headers from the dataframe and search for Action header - Active/Delete/etc
+    action_list = get_action_list(list(traffic_flows_dataframe.columns.values))
+
+    # Classify every row in one go - Delete wins over Enable, Enable set to No means deactivate
+    enable_column = traffic_flows_dataframe[ActionEnable]
+    delete_column = traffic_flows_dataframe[ActionDelete]
+    actions = np.select(
+        [
+            delete_column == "Yes",
+            (enable_column == "Yes") & (delete_column == "No"),
+            (enable_column == "No") & (delete_column == "No"),
+        ],
+        [ActionDelete, ActionEnable, ActionDeactivate],
+        default="",
+    )
+
+    # Keep rules grouped by action in action_list order, and in sheet order within each action
+    action_order = pd.Series(actions).map({action: position for position, action in enumerate(action_list)})
+    selected = action_order.notna().to_numpy()
+    order = np.argsort(action_order[selected].to_numpy(), kind="stable")
+
+    flows_dataframe = traffic_flows_dataframe.loc[selected].iloc[order]
+    actions = actions[selected][order]
+
+    # Columns are read as lists, network and port fields are split row by row in AccessRuleClass
     # Result is List of Access Rules objects
-    acl_list = []
-
-    # process each action - Enable/Delete/etc - create a sub-dataframe with the required actions only
-    for action in action_list:
-        # process special case when Active is set to No, deactivate the rule
-        if action == ActionDeactivate:
-            action_dataframe = traffic_flows_dataframe.loc[
-                (traffic_flows_dataframe[ActionEnable] == "No")
-                & (traffic_flows_dataframe[ActionDelete] == "No")
-                ]
-        elif action == ActionEnable:
-            action_dataframe = traffic_flows_dataframe.loc[
-                (traffic_flows_dataframe[action] == "Yes") & (traffic_flows_dataframe[ActionDelete] == "No")
-            ]
-        elif action == ActionDelete:
-            action_dataframe = traffic_flows_dataframe.loc[(traffic_flows_dataframe[ActionDelete] == "Yes")]
-
-        # Process each Action Dataframe and generate rules for this action
-        for index, row in action_dataframe.iterrows():
-            # app_definition = clsApplication()
-            acl = AccessRuleClass(
-                traffic_flows_dataframe.ix[index, RuleColumnName],
-                traffic_flows_dataframe.ix[index, DescriptionColumnName],
-                action,
-                traffic_flows_dataframe.ix[index, ProtocolColumnName],
-#                traffic_flows_dataframe.ix[index, SourcePortColumnName],
-                traffic_flows_dataframe.ix[index, SourceZoneColumnName],
-                traffic_flows_dataframe.ix[index, SourceNetworkColumnName],
-                traffic_flows_dataframe.ix[index, DestinationZoneColumnName],
-                traffic_flows_dataframe.ix[index, DestinationNetworkColumnName],
-                traffic_flows_dataframe.ix[index, DestinationPortColumnName],
-                traffic_flows_dataframe.ix[index, RuleActionColumnName],
-            )
-            acl_list.append(acl)
+    acl_list = [
+        AccessRuleClass(
+            name,
+            description,
+            action,
+            protocol,
+            source_zone,
+            source_network,
+            destination_zone,
+            destination_network,
+            destination_port,
+            rule_action,
+            row_number,
+        )
+        for (name, description, action, protocol, source_zone, source_network,
+             destination_zone, destination_network, destination_port, rule_action, row_number) in zip(
+            flows_dataframe[RuleColumnName].tolist(),
+            flows_dataframe[DescriptionColumnName].tolist(),
+            actions.tolist(),
+            flows_dataframe[ProtocolColumnName].tolist(),
+            flows_dataframe[SourceZoneColumnName].tolist(),
+            flows_dataframe[SourceNetworkColumnName].tolist(),
+            flows_dataframe[DestinationZoneColumnName].tolist(),
+            flows_dataframe[DestinationNetworkColumnName].tolist(),
+            flows_dataframe[DestinationPortColumnName].tolist(),
+            flows_dataframe[RuleActionColumnName].tolist(),
+            # Sheet row numbers, header is the first row
+            (flows_dataframe.index + 2).tolist(),
+        )
+    ]
 
     return (acl_list, action_list)
 
 
-def generate_config(
-        acl_list, action_list, address_book_dataframe, zones_dataframe, standard_apps_dataframe, device_os
-):
+def resolve_acl(acl, catalog, address_sets=None):
+    """
+    Resolve a rule into vendor-neutral form, which can be rendered for any Network OS
+
+    :param acl: AccessRuleClass object
+    :param catalog: CatalogClass object built by build_catalog
+    :param address_sets: address sets from find_address_sets, if set networks are aggregated and sets are used
+    :return: ResolvedRuleClass object
+    """
+
+    # Applications, addresses and zones are only needed to build a new rule, not to deactivate or delete it
+    if acl.Action != ActionEnable:
+        return ResolvedRuleClass(acl)
+
+    application_definition = ApplicationClass(catalog, acl.Protocol, acl.DestinationPort)
+    zones_definition = ZoneClass(catalog, acl.SourceZone, acl.DestinationZone)
+    address_book_definition = AddressBookEntryClass(
+        catalog, acl.Name, acl.Description, acl.SourceNetworkAndMask, acl.DestinationNetworkAndMask,
+    )
+    if address_sets is not None:
+        address_book_definition.aggregate_networks()
+        address_book_definition.use_address_sets(address_sets)
+
+    return ResolvedRuleClass(acl, application_definition, address_book_definition, zones_definition)
+
+
+def render_acl(acl, catalog, device_os, address_sets=None):
+    """
+    Render a single rule with its applications.
+    Address book entries are returned separately, as they are shared between rules
+
+    :param acl: AccessRuleClass object
+    :param catalog: CatalogClass object built by build_catalog
+    :param device_os: Network OS, such as junos
+    :param address_sets: address sets from find_address_sets, if set networks are aggregated and sets are used
+    :return: (list of config fragments, list of (object name, address book config line) tuples)
+    """
+
+    return get_renderer(device_os).render_rule(resolve_acl(acl, catalog, address_sets))
+
+
+def find_address_sets(acl_list, catalog):
+    """
+    Find groups of address book objects, after networks are aggregated, which are used by more than one rule
+
+    :param acl_list: list of AccessRuleClass objects
+    :param catalog: CatalogClass object built by build_catalog
+    :return: dictionary sorted tuple of object names -> address set name
+    """
+
+    group_count = collections.Counter()
+    for acl in acl_list:
+        if acl.Action == ActionEnable:
+            address_book_definition = AddressBookEntryClass(
+                catalog, acl.Name, acl.Description, acl.SourceNetworkAndMask, acl.DestinationNetworkAndMask,
+            )
+            address_book_definition.aggregate_networks()
+            group_count.update(address_book_definition.get_address_groups().values())
+
+    # Name depends only on members, so the same group gets the same name in every run
+    return {
+        address_group: "aset-" + hashlib.sha1(" ".join(address_group).encode()).hexdigest()[:12]
+        for address_group, count in group_count.items()
+        if count > 1
+    }
+
+
+def iter_config(acl_list, action_list, catalog, device_os, jobs=1, optimize_addresses=False):
+    """
+    Generate device config as a stream of fragments:
+    address book entries used by all rules, each one once, then rules grouped by action.
+    Rules are read only once and spooled to temporary files until the address book is complete
+
+    :param acl_list: iterable of AccessRuleClass objects, such as parse_flows_dataframes or stream_source output
+    :param action_list:
+    :param catalog: CatalogClass object built by build_catalog
+    :param device_os: Network OS, such as junos
+    :param jobs: number of worker processes to render rules
+    :param optimize_addresses: aggregate networks and use address sets for groups of objects shared by rules.
+        Rules are read twice, so a stream of rules is loaded into memory
+    :return: generator of config fragments, each ending with a full line
+    """
+
+    # Unknown Network OS is reported before any rule is read
+    renderer = get_renderer(device_os)
+
+    address_sets = None
+    if optimize_addresses:
+        acl_list = list(acl_list)
+        address_sets = find_address_sets(acl_list, catalog)
+
+    return assemble_config(
+        iter_rendered_acls(acl_list, action_list, catalog, device_os, jobs, address_sets), action_list, renderer
+    )
+
+
+def assemble_config(rendered_acls, action_list, renderer):
+    """
+    :param rendered_acls: iterable of (action, rendered rule, address book entries) tuples
+    :param action_list: actions in the order config is generated
+    :param renderer: renderer object of the Network OS, see renderer_handlers
+    :return: generator of config fragments - address book entries, each one once, then rules grouped by action
+    """
+
+    spools = {action: tempfile.SpooledTemporaryFile(max_size=spool_max_size, mode="w+") for action in action_list}
+    address_book = {}
+    conflicts = []
+
+    try:
+        for action, rendered_acl, address_entries in rendered_acls:
+            spools[action].write(rendered_acl)
+            count(f"rules to {action}")
+
+            for name, command in address_entries:
+                known_command = address_book.setdefault(name, command)
+                if known_command != command:
+                    conflicts.append(f"{known_command} / {command}")
+
+        if conflicts:
+            print(
+                "Address book objects with the same name must be identical, found conflicts:\n  "
+                + "\n  ".join(conflicts)
+            )
+            raise ValueError(f"Conflicting address book definitions: {', '.join(conflicts)}")
+
+        if address_book:
+            yield renderer.section_header(renderer.objects_title)
+            for command in address_book.values():
+                yield "\n" + command
+            yield "\n"
+
+        for action in action_list:
+            yield renderer.section_header(f"Rules to {action}")
+
+            spools[action].seek(0)
+            yield from iter(lambda: spools[action].read(spool_read_size), "")
+    finally:
+        for spool in spools.values():
+            spool.close()
+
+
+def iter_rendered_acls(acl_list, action_list, catalog, device_os, jobs=1, address_sets=None):
+    """
+    Render rules in their original order, either in this process or across a pool of worker processes
+
+    :param acl_list: iterable of AccessRuleClass objects
+    :param action_list: rules with other actions are skipped
+    :param catalog: CatalogClass object built by build_catalog
+    :param device_os: Network OS, such as junos
+    :param jobs: number of worker processes
+    :param address_sets: address sets from find_address_sets
+    :return: generator of (action, rendered rule, address book entries) tuples
+    """
+
+    acl_list = (acl for acl in acl_list if acl.Action in action_list)
+
+    if jobs <= 1:
+        for acl in acl_list:
+            fragments, address_entries = render_acl(acl, catalog, device_os, address_sets)
+            yield acl.Action, "".join(fragments), address_entries
+        return
+
+    # Load standard applications before workers are started, so forked workers share them
+    get_standard_app_registry()
+
+    # Catalog is passed to every worker once, not with every shard.
+    # Only a limited number of shards is queued, so a stream of rules is not read into memory at once
+    with multiprocessing.Pool(
+        jobs, initializer=init_render_worker, initargs=(catalog, device_os, address_sets)
+    ) as pool:
+        pending = collections.deque()
+        while True:
+            shard = list(itertools.islice(acl_list, render_shard_size))
+            if shard:
+                pending.append(pool.apply_async(render_shard, (shard,)))
+            if pending and (not shard or len(pending) >= jobs * 2):
+                yield from pending.popleft().get()
+            elif not shard:
+                break
+
+
+_render_worker = {}
+
+
+def init_render_worker(catalog, device_os, address_sets):
+    _render_worker["catalog"] = catalog
+    _render_worker["device_os"] = device_os
+    _render_worker["address_sets"] = address_sets
+
+
+def render_shard(acl_list):
+    # Runs in a worker process, see iter_rendered_acls
+    rendered_acls = []
+    for acl in acl_list:
+        fragments, address_entries = render_acl(
+            acl, _render_worker["catalog"], _render_worker["device_os"], _render_worker["address_sets"]
+        )
+        rendered_acls.append((acl.Action, "".join(fragments), address_entries))
+    return rendered_acls
+
+
+def write_configs(acl_list, action_list, catalog, device_os_list, file_names, optimize_addresses=False):
+    """
+    Generate config for several Network OS in one run.
+    Rules are resolved once into vendor-neutral form, then each Network OS is rendered in its own process
+
+    :param acl_list: iterable of AccessRuleClass objects
+    :param action_list: actions in the order config is generated
+    :param catalog: CatalogClass object built by build_catalog
+    :param device_os_list: list of Network OS, such as ["junos", "asa"]
+    :param file_names: output file for each Network OS
+    :param optimize_addresses: aggregate networks and use address sets, see iter_config
+    :return: list of numbers of characters written to each file
+    """
+
+    for device_os in device_os_list:
+        get_renderer(device_os)
+
+    acl_list = list(acl_list)
+    address_sets = find_address_sets(acl_list, catalog) if optimize_addresses else None
+    resolved_rules = [resolve_acl(acl, catalog, address_sets) for acl in acl_list if acl.Action in action_list]
+
+    # Resolved rules are passed to every worker once
+    with multiprocessing.Pool(
+        len(device_os_list), initializer=init_config_worker, initargs=(resolved_rules, action_list)
+    ) as pool:
+        return pool.starmap(write_resolved_config, zip(device_os_list, file_names))
+
+
+_config_worker = {}
+
+
+def init_config_worker(resolved_rules, action_list):
+    _config_worker["resolved_rules"] = resolved_rules
+    _config_worker["action_list"] = action_list
+
+
+def write_resolved_config(device_os, file_name):
+    # Runs in a worker process, see write_configs
+    renderer = get_renderer(device_os)
+    return write_config(
+        assemble_config(
+            iter_rendered_rules(_config_worker["resolved_rules"], renderer), _config_worker["action_list"], renderer
+        ),
+        file_name,
+    )
+
+
+def iter_rendered_rules(resolved_rules, renderer):
+    # Same output as iter_rendered_acls, for already resolved rules
+    for rule in resolved_rules:
+        fragments, address_entries = renderer.render_rule(rule)
+        yield rule.Action, "".join(fragments), address_entries
+
+
+def generate_config(acl_list, action_list, catalog, device_os):
     """
 
     :param acl_list:
     :param action_list:
+    :param catalog: CatalogClass object built by build_catalog
     :param device_os: Network OS, such as junos
-    :param address_book_dataframe:
-    :param zones_dataframe:
-    :param standard_apps_dataframe:
     :return: Device Configuration as a string
     """
 
-    device_config = ""
-    for action in action_list:
-        device_config = (
-                device_config
-                + f"\n\n# ------------------------ Rules to {action} ---------------------------------"
-        )
+    return "".join(iter_config(acl_list, action_list, catalog, device_os))
 
-        for acl in acl_list:
-            if acl.Action == action:
-                application_definition = ApplicationClass(
-                    standard_apps_dataframe, acl.Protocol, acl.DestinationPort
-                )
-                zones_definition = ZoneClass(zones_dataframe, acl.SourceZone, acl.DestinationZone)
-                address_book_definition = AddressBookEntryClass(
-                    address_book_dataframe,
-                    acl.Name,
-                    acl.Description,
-                    acl.SourceNetworkAndMask,
-                    acl.DestinationNetworkAndMask,
-                )
-                device_config = device_config + f"\n# -------- {acl.Description} -------------"
-                if action == ActionEnable:
-                    device_config = (
-                            device_config + application_definition.convert_to_device_format(device_os) + "\n"
-                    )
-                    device_config = (
-                            device_config + address_book_definition.convert_to_device_format(device_os) + "\n"
-                    )
-
-                device_config = (
-                    device_config
-                    + acl.convert_to_device_format(
-                        device_os, application_definition, address_book_definition, zones_definition
-                    )
-                    + "\n"
-                )
-
-    return device_config
+
+def write_config(config_fragments, file_name, screen_output=False):
+    """
+    Write config fragments to a file as they are generated, optionally echo them to screen.
+    Fragments are written to a temporary file, which replaces the output file only when all are written,
+    so an error while the config is generated leaves the previous file as it was
+
+    :param config_fragments: iterable of strings, such as iter_config output
+    :param file_name: output file
+    :param screen_output: print fragments to stdout as well
+    :return: number of characters written
+    """
+
+    written = 0
+    temp_file_name = f"{file_name}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file_name, "w") as f:
+            for fragment in config_fragments:
+                f.write(fragment)
+                if screen_output:
+                    sys.stdout.write(fragment)
+                written += len(fragment)
+        os.replace(temp_file_name, file_name)
+    finally:
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+
+    if screen_output:
+        sys.stdout.write("\n")
+
+    return written
@@ -1,3 +1,8 @@
+import time
+
+# Imports are timed for --profile
+import_started = time.perf_counter()
+
 import argparse
 import logging
 import sys
@@ -7,9 +12,36 @@ from pathlib import Path  # OS-agnostic file handling
 
 from colorama import init, Fore  # colored screen output
 
+from analysis_handlers import (
+    FlowLookupClass,
+    analyze_rules,
+    check_references,
+    query_flows,
+    print_analysis_report,
+    print_check_report,
+    print_query_report,
+    save_analysis_report,
+    save_query_report,
+)
+from batch_handlers import find_workbooks, run_batch, print_batch_report, save_batch_report
 from constdefs import *
-from data_handlers import load_source, parse_flows_dataframes, generate_config
-from network_handlers import connect_to_fw_validate_config
+from data_handlers import (
+    load_source,
+    stream_source,
+    build_catalog,
+    parse_flows_dataframes,
+    iter_config,
+    write_config,
+    write_configs,
+)
+from profile_handlers import ProfileClass, count, print_profile_report, save_profile_report
+from renderer_handlers import get_renderer
+from running_config_handlers import load_running_config, write_running_config_delta
+from sqlite_handlers import import_source, read_store
+from state_handlers import load_state, save_state, diff_rules
+from watch_handlers import WatchClass, watch_source
+
+import_seconds = time.perf_counter() - import_started
 
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
@@ -40,6 +72,19 @@ class CustomParser(argparse.ArgumentParser):
 # -------------------------------------------------------------------------------------------
 
 
+def zone_pair_argument(value):
+    """
+    :param value: --zone-pair value, such as dmz1,internet-untrust
+    :return: [source zone, destination zone]
+    """
+    zones = [zone.strip() for zone in value.split(",")]
+    if len(zones) != 2 or not all(zones):
+        raise argparse.ArgumentTypeError(
+            f"'{value}' is not a zone pair, use source and destination zones separated by a comma, such as dmz1,dmz2"
+        )
+    return zones
+
+
 def parse_args(args=sys.argv[1:]):
     """Parse arguments."""
     parser = CustomParser()
@@ -66,9 +111,169 @@ def parse_args(args=sys.argv[1:]):
         "--source_filename", "--source", help="File to parse",
     )
     optional.add_argument(
-        "--network-os", "--network_os", help="Network OS to generate the config for",
+        "--batch",
+        help="Directory or glob of workbooks, such as sites/*.xlsx, to generate the config of each one",
+    )
+    optional.add_argument(
+        "--network-os", "--network_os", help="Network OS to generate the config for: junos, asa or both - junos,asa",
+    )
+    optional.add_argument(
+        "--inventory", help="Validate with all test devices listed in this JSON file, instead of one device",
+    )
+    optional.add_argument(
+        "--max-sessions",
+        "--max_sessions",
+        type=int,
+        default=8,
+        help="Maximum number of concurrent SSH sessions when validating with inventory devices",
+    )
+    optional.add_argument(
+        "--device-timeout",
+        "--device_timeout",
+        type=int,
+        default=60,
+        help="Per device SSH connection timeout in seconds",
+    )
+    optional.add_argument(
+        "--device-deadline",
+        "--device_deadline",
+        type=int,
+        default=900,
+        help="Per device limit in seconds for the whole validation, retries included",
+    )
+    optional.add_argument(
+        "--retries", type=int, default=1, help="Per device number of retries after a connection error",
+    )
+    optional.add_argument(
+        "--push-method",
+        "--push_method",
+        choices=["scp", "chunked"],
+        default="scp",
+        help="Copy config to the device as a file and load it, or send it in batches of lines",
+    )
+    optional.add_argument(
+        "--batch-size",
+        "--batch_size",
+        type=int,
+        default=config_batch_size,
+        help="Number of config lines per batch for chunked push method",
+    )
+    optional.add_argument(
+        "--validation-cache",
+        "--validation_cache",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Commit check only rules which haven't passed it on the same device model and version before",
+    )
+    optional.add_argument(
+        "--no-cache",
+        "--no_cache",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Parse the source file even if it is cached",
+    )
+    optional.add_argument(
+        "--stream",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Read Traffic Flows row by row, for very large source files",
+    )
+    optional.add_argument(
+        "--sqlite",
+        help="SQLite file to read rules from. With --source, the source file is imported into it first",
+    )
+    optional.add_argument(
+        "--zone-pair",
+        "--zone_pair",
+        type=zone_pair_argument,
+        help="Used with --sqlite, generate config only for rules of a zone pair, such as dmz1,internet-untrust",
+    )
+    optional.add_argument(
+        "--address", help="Used with --sqlite, generate config only for rules with this address object or network",
+    )
+    optional.add_argument(
+        "--jobs", "-j", type=int, default=1, help="Number of processes to generate the config, default is 1",
+    )
+    optional.add_argument(
+        "--optimize-addresses",
+        "--optimize_addresses",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Aggregate networks and use address sets for groups of objects shared by rules",
+    )
+    optional.add_argument(
+        "--check",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Check that zones, address objects and applications used by rules are defined. Also done with --validate",
+    )
+    optional.add_argument(
+        "--analyze",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Report shadowed, redundant and mergeable rules",
+    )
+    optional.add_argument(
+        "--query-csv",
+        "--query_csv",
+        help="CSV file of flows to look up in the rules, with the same column names as Traffic Flows sheet",
+    )
+    optional.add_argument(
+        "--profile",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Report time, peak memory and counters of each stage",
+    )
+    optional.add_argument(
+        "--cprofile",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Used with --profile, runs config generation under cProfile",
+    )
+    optional.add_argument(
+        "--running-config",
+        "--running_config",
+        help="Saved output of show configuration | display set, only statements missing on the device are saved",
+    )
+    optional.add_argument(
+        "--watch",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Keep running and regenerate the config each time the source file is saved",
+    )
+    optional.add_argument(
+        "--watch-interval",
+        "--watch_interval",
+        type=float,
+        default=1.0,
+        help="Seconds between checks of the source file with --watch, default is 1",
+    )
+    optional.add_argument(
+        "--incremental",
+        default=False,
+        required=False,
+        action="store_true",
+        help="Generate config only for rules changed since the previous incremental run",
+    )
+    optional.add_argument(
+        "--state-file", "--state_file", help="State file for incremental runs",
     )
-    return parser.parse_args(args)
+    options = parser.parse_args(args)
+
+    if options.incremental and (options.zone_pair or options.address):
+        # Rules outside of the subset would be deleted from the device and dropped from the state file
+        parser.error("--incremental can't be used with --zone-pair or --address, state is kept for all rules")
+
+    return options
 
 
 def main():
@@ -79,37 +284,249 @@ def main():
     options = parse_args()
 
     source_filename = options.source_filename if options.source_filename else test_filename
-    network_os = options.network_os if options.network_os else "junos"
-
-    # 1. parse Excel into dataframes
-    traffic_flows_dataframe, address_book_dataframe, zones_dataframe, standard_apps_dataframe = load_source(
-        source_filename
-    )
+    # One or more Network OS, such as junos,asa - rules are parsed once and rendered for each of them
+    network_os_list = [device_os.strip().lower() for device_os in (options.network_os or "junos").split(",")]
+    network_os = "-".join(network_os_list)
 
-    # 2. Get list of Firewall Rules and actions
-    acl_list, action_list = parse_flows_dataframes(traffic_flows_dataframe)
+    # Created first, as it resets counters, such as standard application file loads by renderers below
+    profile = ProfileClass(options.profile, ["generate"] if options.cprofile else [])
+    profile.add_stage("import", import_seconds)
 
-    # 3. Generate config for a given network OS
-    config = generate_config(
-        acl_list, action_list, address_book_dataframe, zones_dataframe, standard_apps_dataframe, network_os
-    )
+    for device_os in network_os_list:
+        # Fails early on unsupported Network OS
+        get_renderer(device_os)
 
-    if config:
-        print(Fore.GREEN + f"--------------- Config parsed and saved to a file -------------------")
+    # Batch mode - each workbook is built in a worker process, with its own output files
+    if options.batch:
+        print(Fore.GREEN + f"--------------- Batch build of {options.batch} -------------------")
+        report = run_batch(
+            find_workbooks(options.batch),
+            network_os_list,
+            jobs=options.jobs,
+            check=options.check,
+            use_cache=not options.no_cache,
+            stream=options.stream,
+            optimize_addresses=options.optimize_addresses,
+        )
+        print(Fore.GREEN + f"\n--------------- Batch summary -------------------")
+        print_batch_report(report)
+        print("\nBatch report saved as: " + str(Path(save_batch_report(report)).resolve()))
+        if report["failed"]:
+            sys.exit(1)
+        return
 
-        file_name = f"{output_dir}{network_os}-{datetime.now().strftime('%Y-%m-%d')}.txt".lower()
+    # Watch mode - workbook, catalog and rendered rules are kept in memory between saves
+    if options.watch:
+        date = datetime.now().strftime("%Y-%m-%d")
+        file_names = [f"{output_dir}{device_os}-{date}.txt" for device_os in network_os_list]
         Path(output_dir).mkdir(parents=True, exist_ok=True)
+        print(Fore.GREEN + f"--------------- Watching {source_filename}, press Ctrl+C to stop -------------------")
+        for file_name in file_names:
+            print("Config is saved as: " + str(Path(file_name).resolve()))
+        watch_source(
+            WatchClass(source_filename, network_os_list, file_names, optimize_addresses=options.optimize_addresses),
+            interval=options.watch_interval,
+        )
+        return
 
-        with open(file_name, "w") as f:
-            f.write(config)
-        print("\nConfig saved as: " + str(Path(file_name).resolve()))
+    if options.sqlite:
+        # 1-3. Optionally import the source file, then read rules from the store, or only an indexed subset of them
+        with profile.stage("load"):
+            if options.source_filename:
+                print(f"Imported {import_source(source_filename, options.sqlite)} rows into {options.sqlite}")
+            catalog, action_list, acl_list = read_store(
+                options.sqlite,
+                zone_pair=options.zone_pair,
+                address=options.address,
+            )
+    elif options.stream:
+        # 1-3. Compile reference sheets and read Firewall Rules lazily, row by row
+        with profile.stage("load"):
+            catalog, action_list, acl_list = stream_source(source_filename)
+    else:
+        # 1. parse Excel into dataframes
+        with profile.stage("load"):
+            traffic_flows_dataframe, address_book_dataframe, zones_dataframe, standard_apps_dataframe = load_source(
+                source_filename, use_cache=not options.no_cache
+            )
+
+        with profile.stage("parse"):
+            # 2. Compile Address Book, Zones and Applications into indexes
+            catalog = build_catalog(address_book_dataframe, zones_dataframe, standard_apps_dataframe)
+
+            # 3. Get list of Firewall Rules and actions
+            acl_list, action_list = parse_flows_dataframes(traffic_flows_dataframe)
+
+    # Check references before the config is generated, and before it's sent to a test device
+    if options.check or options.validate:
+        # Rules are read twice - for the check and to generate the config
+        with profile.stage("check"):
+            acl_list = list(acl_list)
+            report = check_references(acl_list, catalog, network_os_list)
+        print(Fore.GREEN + f"--------------- Reference check -------------------")
+        print_check_report(report)
+        if report["errors"]:
+            print(Fore.RED + "\nFix errors above, config is not generated")
+            sys.exit(1)
+
+    # Optional - find rules which never match traffic or can be merged
+    if options.analyze:
+        # Rules are read twice - for analysis and to generate the config
+        with profile.stage("analyze"):
+            acl_list = list(acl_list)
+            report = analyze_rules(acl_list, catalog)
+        print(Fore.GREEN + f"--------------- Rules analysis -------------------")
+        print_analysis_report(report)
+        print("\nAnalysis saved as: " + str(Path(save_analysis_report(report)).resolve()) + "\n")
+
+    # Optional - find the first rule which matches each flow of a CSV file
+    if options.query_csv:
+        # Rules are read twice - for lookups and to generate the config
+        with profile.stage("query"):
+            acl_list = list(acl_list)
+            flow_lookup = FlowLookupClass(acl_list, catalog)
+            started = time.perf_counter()
+            report = query_flows(flow_lookup, options.query_csv)
+            seconds = time.perf_counter() - started
+        print(Fore.GREEN + f"--------------- Flow lookup -------------------")
+        print_query_report(report, seconds)
+        print("\nResults saved as: " + str(Path(save_query_report(report)).resolve()) + "\n")
+
+    file_names = [f"{output_dir}{device_os}-{datetime.now().strftime('%Y-%m-%d')}.txt" for device_os in network_os_list]
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    # Optional - keep only rules which are new, changed or removed since the previous run
+    if options.incremental:
+        state_filename = (
+            options.state_file
+            if options.state_file
+            else f"{output_dir}{Path(options.sqlite or source_filename).stem}-{network_os}-state.json".lower()
+        )
+        acl_list, new_state, summary = diff_rules(acl_list, catalog, network_os, load_state(state_filename))
+        print(
+            Fore.GREEN + f"--------------- Incremental build: {summary['new']} new, {summary['changed']} changed, "
+            f"{summary['removed']} removed, {summary['unchanged']} unchanged rules -------------------"
+        )
+        file_names = [file_name.replace(".txt", "-delta.txt") for file_name in file_names]
+
+    # 4. Generate config for a given network OS and stream it to a file
+    print(Fore.GREEN + f"--------------- Config parsed and saved to a file -------------------")
 
     if options.screen_output:
         print(Fore.GREEN + "\n------------------- Firewall configuration below --------------------")
-        print(config)
+
+    if len(network_os_list) == 1:
+        config_fragments = iter_config(
+            acl_list,
+            action_list,
+            catalog,
+            network_os,
+            jobs=options.jobs,
+            optimize_addresses=options.optimize_addresses,
+        )
+        if options.profile:
+            # Generate the whole config before writing it, to measure both stages separately
+            with profile.stage("generate"):
+                config_fragments = list(config_fragments)
+
+        with profile.stage("write"):
+            count("bytes emitted", write_config(config_fragments, file_names[0], screen_output=options.screen_output))
+    else:
+        # Each Network OS is rendered and written by its own process
+        with profile.stage("generate"):
+            count(
+                "bytes emitted",
+                sum(
+                    write_configs(
+                        acl_list,
+                        action_list,
+                        catalog,
+                        network_os_list,
+                        file_names,
+                        optimize_addresses=options.optimize_addresses,
+                    )
+                ),
+            )
+        if options.screen_output:
+            for file_name in file_names:
+                print(Path(file_name).read_text())
+
+    for file_name in file_names:
+        print("\nConfig saved as: " + str(Path(file_name).resolve()))
+
+    # Optional - keep only statements which add or change something on the device
+    if options.running_config:
+        if "junos" in network_os_list:
+            with profile.stage("running_config"):
+                running_config = load_running_config(options.running_config)
+                file_name = file_names[network_os_list.index("junos")]
+                delta_file_name = file_name.replace(".txt", "-running.txt")
+                summary = write_running_config_delta(file_name, delta_file_name, running_config)
+            print(
+                Fore.GREEN + f"--------------- Running config: {summary['emitted']} statements to set, "
+                f"{summary['deleted']} to delete, {summary['unchanged']} already on the device -------------------"
+            )
+            print("\nConfig changes saved as: " + str(Path(delta_file_name).resolve()))
+        else:
+            print(Fore.RED + "Only junos config can be compared with the running config")
+
+    if options.incremental:
+        save_state(new_state, state_filename)
 
     if options.validate:
-        connect_to_fw_validate_config(config, virtual_srx)
+        # Test devices are SRX
+        if "junos" in network_os_list:
+            with profile.stage("validate"):
+                validate(options, file_names[network_os_list.index("junos")])
+        else:
+            print(Fore.RED + "Only junos config can be validated")
+
+    if options.profile:
+        profile.stop()
+        report = profile.get_report()
+        print(Fore.GREEN + f"\n--------------- Profile -------------------")
+        print_profile_report(report)
+        print("\nProfile saved as: " + str(Path(save_profile_report(report)).resolve()))
+
+
+def validate(options, file_name):
+    """
+    Validate generated config with test devices
+
+    :param options: CLI options
+    :param file_name: generated config file
+    """
+
+    # Device libraries take a long time to import, so they are imported only to validate
+    from network_handlers import (
+        connect_to_fw_validate_config,
+        load_inventory,
+        prepare_devices,
+        validate_config_on_inventory,
+        print_validation_report,
+        save_validation_report,
+    )
+
+    if options.inventory or options.validation_cache:
+        config = Path(file_name).read_text()
+        devices = load_inventory(options.inventory) if options.inventory else prepare_devices([dict(virtual_srx)])
+        print(Fore.GREEN + "------------ Validating configuration with test devices --------------")
+        report = validate_config_on_inventory(
+            config,
+            devices,
+            max_sessions=options.max_sessions,
+            timeout=options.device_timeout,
+            retries=options.retries,
+            deadline=options.device_deadline,
+            push_method=options.push_method,
+            batch_size=options.batch_size,
+            fragment_cache=options.validation_cache,
+        )
+        print_validation_report(report)
+        print("\nValidation report saved as: " + str(Path(save_validation_report(report)).resolve()))
+    else:
+        config = Path(file_name).read_text()
+        connect_to_fw_validate_config(config, virtual_srx, options.push_method, options.batch_size)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,152 @@
+import concurrent.futures
 import getpass
+import hashlib
+import json
 import os
+import re
+import threading
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path  # OS-agnostic file handling
 
-from netmiko import ConnectHandler, NetMikoTimeoutException
-from paramiko import AuthenticationException
+from netmiko import ConnectHandler, NetMikoTimeoutException, file_transfer
+from paramiko import AuthenticationException, SSHException
 from colorama import init, Fore, Style  # colored screen output
+from scp import SCPException
 
+from constdefs import *
 
-def connect_to_fw_validate_config(config, device):
+
+# Errors of SCP and of Netmiko file transfer checks, such as not enough space on the device
+file_transfer_errors = (SCPException, NetMikoTimeoutException, SSHException, OSError, ValueError)
+
+# Lines of load set output for statements which were not loaded, such as: terminal:3:(8) syntax error: foo
+load_error_pattern = re.compile(r"^.*(?:syntax error|error:).*$", re.MULTILINE | re.IGNORECASE)
+
+
+def get_config_statements(config_commands):
+    # Config lines without comments and empty lines
+    return [command for command in config_commands if command.strip() and not command.startswith("#")]
+
+
+def copy_config_file(net_connect, config_commands, file_system=device_file_system):
+    """
+    Copy config to the device as a file over SCP
+
+    :param net_connect: Netmiko connection
+    :param config_commands: list of config lines
+    :param file_system: device directory to copy the file to
+    :return: file path on the device
+    """
+
+    with tempfile.NamedTemporaryFile("w", suffix=".set", delete=False) as f:
+        f.write("\n".join(get_config_statements(config_commands)) + "\n")
+        source_file = f.name
+
+    dest_file = f"fw-rule-manager-{os.getpid()}.set"
+    try:
+        file_transfer(
+            net_connect, source_file=source_file, dest_file=dest_file, file_system=file_system, overwrite_file=True
+        )
+    finally:
+        os.remove(source_file)
+
+    return f"{file_system}/{dest_file}"
+
+
+def load_config_file(net_connect, remote_file):
+    """
+    Load a config file copied to the device with a single command, then delete the file
+
+    :param net_connect: Netmiko connection
+    :param remote_file: file path on the device
+    :return: load command output
+    """
+
+    try:
+        load_output = net_connect.send_config_set([f"load set {remote_file}"], exit_config_mode=False)
+    finally:
+        try:
+            net_connect.send_config_set([f"run file delete {remote_file}"], exit_config_mode=False)
+        except Exception as e:
+            # Load result is more important, the file is overwritten by the next push
+            print(f"{remote_file} was not deleted: {type(e).__name__}: {e}")
+
+    # Lines which failed are skipped by load set, the rest is still loaded
+    load_errors = load_error_pattern.findall(load_output)
+    if load_errors:
+        print(f"load set {remote_file} failed:\n  " + "\n  ".join(load_errors))
+        raise ValueError(f"load set failed: {load_errors[0]}")
+
+    return load_output
+
+
+def push_config_file(net_connect, config_commands, file_system=device_file_system):
+    """
+    Copy config to the device as a file over SCP and load it with a single command
+
+    :param net_connect: Netmiko connection
+    :param config_commands: list of config lines
+    :param file_system: device directory to copy the file to
+    :return: load command output
+    """
+
+    return load_config_file(net_connect, copy_config_file(net_connect, config_commands, file_system))
+
+
+def push_config_chunked(net_connect, config_commands, batch_size=config_batch_size):
+    """
+    Send config lines in batches, each batch with a single send_config_set call
+
+    :param net_connect: Netmiko connection
+    :param config_commands: list of config lines
+    :param batch_size: number of lines per batch
+    :return: list of per batch timings, in seconds
+    """
+
+    batch_timings = []
+    config_statements = get_config_statements(config_commands)
+
+    for position in range(0, len(config_statements), batch_size):
+        started = time.perf_counter()
+        net_connect.send_config_set(
+            config_statements[position : position + batch_size], exit_config_mode=False, cmd_verify=False
+        )
+        batch_timings.append(round(time.perf_counter() - started, 3))
+
+    return batch_timings
+
+
+def push_config(net_connect, config_commands, push_method="scp", batch_size=config_batch_size):
+    """
+    Push config to the device, as a file with load set command or in batches of lines.
+    If the file can't be copied, falls back to batches
+
+    :param net_connect: Netmiko connection
+    :param config_commands: list of config lines
+    :param push_method: scp or chunked
+    :param batch_size: number of lines per batch for chunked method
+    :return: dictionary - method used, load output or per batch timings, fallback reason if any
+    """
+
+    push_result = {"method": push_method}
+    if push_method == "scp":
+        try:
+            remote_file = copy_config_file(net_connect, config_commands)
+        except file_transfer_errors as e:
+            push_result["method"] = "chunked"
+            push_result["fallback_reason"] = f"{type(e).__name__}: {e}"
+        else:
+            # Errors of the config itself are not fixed by sending it again in batches
+            push_result["load"] = load_config_file(net_connect, remote_file)
+            return push_result
+
+    push_result["batch_timings"] = push_config_chunked(net_connect, config_commands, batch_size)
+    return push_result
+
+
+def connect_to_fw_validate_config(config, device, push_method="scp", batch_size=config_batch_size):
 
     try:
         device["password"] = os.environ["FW_MAN_PASSWORD"]
@@ -45,7 +185,20 @@ def connect_to_fw_validate_config(config, device):
     config_commands = config.splitlines()
     # print("Deploying config:", config_commands)
 
-    net_connect.send_config_set(config_commands, exit_config_mode=False, cmd_verify=False)
+    try:
+        push_result = push_config(net_connect, config_commands, push_method, batch_size)
+    except ValueError:
+        # Lines which failed are printed by load_config_file
+        print(Fore.RED + "------------ Loading config failed - Rollback -----------")
+        net_connect.send_command("rollback 0")
+        exit(1)
+    if "fallback_reason" in push_result:
+        print(f"Copying config file failed, sent in batches instead: {push_result['fallback_reason']}")
+    if "batch_timings" in push_result:
+        print(
+            f"Sent {len(push_result['batch_timings'])} batches of up to {batch_size} lines "
+            f"in {round(sum(push_result['batch_timings']), 3)}s"
+        )
 
     # for command in config_commands:
     #     print("sending", command)
@@ -97,3 +250,434 @@ def connect_to_fw_validate_config(config, device):
 
     print("\n")
     print(80 * "-")
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def load_inventory(filename):
+    """
+    Load test devices to validate the config with.
+    JSON list of devices, each one with Netmiko connection parameters and an optional name, such as
+    [{"name": "lab-srx1", "device_type": "juniper", "host": "10.27.40.181", "username": "alex", "port": 22}]
+
+    :param filename: inventory file
+    :return: list of device dictionaries
+    """
+
+    with open(filename, "r") as f:
+        devices = json.load(f)
+
+    return prepare_devices(devices)
+
+
+def prepare_devices(devices):
+    """
+    :param devices: list of device dictionaries
+    :return: same devices, with names and passwords set
+    """
+
+    # Devices without own password use the same one, asked only once
+    password = None
+    for device in devices:
+        device.setdefault("name", device["host"])
+        if not device.get("password"):
+            if password is None:
+                password = os.environ.get("FW_MAN_PASSWORD") or getpass.getpass()
+            device["password"] = password
+
+    return devices
+
+
+def validate_config_on_device(
+    config_commands,
+    device,
+    timeout=60,
+    retries=1,
+    connect=ConnectHandler,
+    push_method="scp",
+    batch_size=config_batch_size,
+    fragment_cache=False,
+    deadline=None,
+):
+    """
+    Push config to a test device, run commit check and show | compare, then roll back.
+    Doesn't print or exit, all outcomes are returned in the result
+
+    :param config_commands: list of config lines
+    :param device: device dictionary from load_inventory
+    :param timeout: SSH connection timeout, in seconds
+    :param retries: how many times to reconnect after a connection error or timeout
+    :param connect: connection factory, Netmiko ConnectHandler or a stand-in with the same interface
+    :param push_method: scp or chunked, see push_config
+    :param batch_size: number of lines per batch for chunked method
+    :param fragment_cache: check only rules not yet validated on this device model and version,
+        see validate_config_fragments
+    :param deadline: wall-clock limit for the device in seconds, retries included. When it's exceeded,
+        the session is closed and the device is reported as error. None for no limit
+    :return: result dictionary - device name, status passed/failed/error, commit check and compare output, timings
+    """
+
+    connection_parameters = {key: value for key, value in device.items() if key != "name"}
+    connection_parameters.setdefault("timeout", timeout)
+
+    result = {"device": device["name"], "status": "error", "attempts": 0, "timings": {}}
+    started = time.perf_counter()
+    # Open session, closed at the deadline to stop a command which doesn't return
+    sessions = []
+
+    def run_attempts():
+        for attempt in range(1, retries + 2):
+            result["attempts"] = attempt
+            try:
+                step_started = time.perf_counter()
+                net_connect = connect(**connection_parameters)
+                result["timings"]["connect"] = round(time.perf_counter() - step_started, 3)
+                sessions[:] = [net_connect]
+
+                try:
+                    if fragment_cache:
+                        step_started = time.perf_counter()
+                        result.update(
+                            validate_config_fragments(net_connect, config_commands, push_method, batch_size)
+                        )
+                        result["timings"]["commit_check"] = round(time.perf_counter() - step_started, 3)
+                        result.pop("error", None)
+                        break
+
+                    step_started = time.perf_counter()
+                    result["push"] = push_config(net_connect, config_commands, push_method, batch_size)
+                    result["timings"]["push"] = round(time.perf_counter() - step_started, 3)
+
+                    step_started = time.perf_counter()
+                    commit_check = net_connect.send_config_set(["commit check"], exit_config_mode=False)
+                    result["timings"]["commit_check"] = round(time.perf_counter() - step_started, 3)
+                    result["commit_check"] = commit_check
+
+                    if "succeeds" in commit_check:
+                        result["status"] = "passed"
+                        result["compare"] = net_connect.send_config_set("show | compare", exit_config_mode=False)
+                    else:
+                        result["status"] = "failed"
+                finally:
+                    # Rollback anyway to previous clean state
+                    net_connect.send_command("rollback 0")
+                    net_connect.disconnect()
+                    sessions.clear()
+
+                result.pop("error", None)
+                break
+
+            except AuthenticationException:
+                # Wrong credentials won't be fixed by retrying
+                result["error"] = "Authentication failed"
+                break
+            except (NetMikoTimeoutException, SSHException, OSError) as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+                if attempt <= retries:
+                    time.sleep(attempt)
+            except Exception as e:
+                # Unexpected device response, reported for this device only
+                result["error"] = f"{type(e).__name__}: {e}"
+                break
+
+    if deadline is None:
+        run_attempts()
+    else:
+        # Netmiko timeouts apply to each read, a device which keeps sending output is only stopped by the deadline
+        worker = threading.Thread(target=run_attempts, daemon=True)
+        worker.start()
+        worker.join(deadline)
+        if worker.is_alive():
+            for net_connect in list(sessions):
+                try:
+                    net_connect.disconnect()
+                except Exception:
+                    pass
+            # Worker thread may still update its result, a copy is returned
+            result = {
+                "device": device["name"],
+                "status": "error",
+                "attempts": result["attempts"],
+                "timings": dict(result["timings"]),
+                "error": f"Deadline of {deadline} seconds exceeded",
+            }
+
+    result["timings"]["total"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def split_config_fragments(config_commands):
+    """
+    Split generated config into per-rule fragments and shared address book definitions
+
+    :param config_commands: list of config lines
+    :return: (list of fragments - rule name and config statements, dictionary object name -> config statements)
+    """
+
+    fragments = []
+    definitions = {}
+    fragment = None
+
+    for command in config_commands:
+        if command.startswith("# ------------------------ "):
+            # Section header - Address Book or Rules to ...
+            fragment = None
+        elif command.startswith("#"):
+            # Rule description starts a new fragment
+            fragment = {"name": command.strip("# -"), "statements": []}
+            fragments.append(fragment)
+        elif command.strip():
+            if fragment is not None:
+                fragment["statements"].append(command)
+            elif command.startswith("set security address-book global "):
+                # set security address-book global address NAME ... / address-set NAME address MEMBER
+                definitions.setdefault(command.split()[5], []).append(command)
+
+    for fragment in fragments:
+        policy_name = re.search(r" policy (\S+)", " ".join(fragment["statements"]))
+        if policy_name:
+            fragment["name"] = policy_name.group(1)
+
+    return fragments, definitions
+
+
+def get_fragment_dependencies(statements, definitions):
+    """
+    :param statements: config statements of a rule
+    :param definitions: dictionary object name -> config statements, from split_config_fragments
+    :return: address book statements needed by the rule, address set members first
+    """
+
+    names = []
+    for statement in statements:
+        for address_list in re.findall(r"(?:source|destination)-address \[([^\]]*)\]", statement):
+            names.extend(address_list.split())
+
+    dependencies = {}
+    while names:
+        name = names.pop()
+        if name in dependencies or name not in definitions:
+            continue
+        dependencies[name] = definitions[name]
+        # Address set members
+        names.extend(re.findall(r"address-set \S+ address (\S+)", " ".join(definitions[name])))
+
+    return [statement for name in reversed(list(dependencies)) for statement in dependencies[name]]
+
+
+def get_device_version(net_connect):
+    """
+    :param net_connect: Netmiko connection
+    :return: device model and software version, such as vsrx-19.4r1.10
+    """
+
+    show_version = net_connect.send_command("show version")
+    model = re.search(r"Model: (\S+)", show_version)
+    version = re.search(r"Junos: (\S+)", show_version)
+
+    return f"{model.group(1) if model else 'unknown'}-{version.group(1) if version else 'unknown'}".lower()
+
+
+_fragment_cache_lock = threading.Lock()
+
+
+def load_fragment_cache(device_version):
+    try:
+        with open(f"{cache_dir}commit-check-{device_version}.json", "r") as f:
+            return set(json.load(f))
+    except FileNotFoundError:
+        return set()
+
+
+def save_fragment_cache(device_version, passed_hashes):
+    # Devices of the same model and version are validated in parallel and share the cache file
+    with _fragment_cache_lock:
+        passed_hashes = load_fragment_cache(device_version) | set(passed_hashes)
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        with open(f"{cache_dir}commit-check-{device_version}.json", "w") as f:
+            json.dump(sorted(passed_hashes), f)
+
+
+def validate_config_fragments(net_connect, config_commands, push_method="scp", batch_size=config_batch_size):
+    """
+    Commit check only rules which haven't passed commit check on the same device model and version before.
+    A rule is identified by the hash of its statements and of the address book entries it uses.
+    If a group of rules fails, it's split in halves until the failing rules are found
+
+    :param net_connect: Netmiko connection, in clean state
+    :param config_commands: list of config lines
+    :param push_method: scp or chunked, see push_config
+    :param batch_size: number of lines per batch for chunked method
+    :return: dictionary - status, device version, number of rules cached and checked, failed rules
+    """
+
+    device_version = get_device_version(net_connect)
+    passed_hashes = load_fragment_cache(device_version)
+
+    fragments, definitions = split_config_fragments(config_commands)
+    for fragment in fragments:
+        fragment["dependencies"] = get_fragment_dependencies(fragment["statements"], definitions)
+        fragment["hash"] = hashlib.sha256(
+            "\n".join(fragment["dependencies"] + fragment["statements"]).encode()
+        ).hexdigest()
+
+    pending = [fragment for fragment in fragments if fragment["hash"] not in passed_hashes]
+    result = {
+        "device_version": device_version,
+        "fragments": len(fragments),
+        "cached": len(fragments) - len(pending),
+        "checked": len(pending),
+        "commit_checks": 0,
+        "failed_fragments": [],
+    }
+
+    # Hashes of rules which passed, saved once all groups are checked
+    passed = []
+
+    def check(group):
+        """
+        Push a group of rules with the address book entries they need, then roll back
+
+        :param group: list of fragments
+        :return: True if commit check of the group succeeds
+        """
+        statements = list(dict.fromkeys(
+            statement for fragment in group for statement in fragment["dependencies"] + fragment["statements"]
+        ))
+        try:
+            push_config(net_connect, statements, push_method, batch_size)
+            commit_check = net_connect.send_config_set(["commit check"], exit_config_mode=False)
+        except ValueError as e:
+            # Statements which load set rejects fail the group, same as a failed commit check
+            commit_check = str(e)
+        net_connect.send_command("rollback 0")
+        result["commit_checks"] += 1
+
+        if "succeeds" in commit_check:
+            passed.extend(fragment["hash"] for fragment in group)
+            return True
+        if len(group) == 1:
+            result["failed_fragments"].append({"fragment": group[0]["name"], "commit_check": commit_check})
+            return False
+
+        passed_before = len(passed)
+        first_half_passed = check(group[: len(group) // 2])
+        second_half_passed = check(group[len(group) // 2 :])
+        if first_half_passed and second_half_passed:
+            # Rules fail only together, so the whole group is the failure and none of them is cached
+            del passed[passed_before:]
+            result["failed_fragments"].append(
+                {"fragment": ", ".join(fragment["name"] for fragment in group), "commit_check": commit_check}
+            )
+        return False
+
+    if pending:
+        check(pending)
+    if passed:
+        save_fragment_cache(device_version, passed)
+
+    result["status"] = "failed" if result["failed_fragments"] else "passed"
+    result["commit_check"] = "\n".join(
+        f"{failed['fragment']}:\n{failed['commit_check']}" for failed in result["failed_fragments"]
+    )
+    return result
+
+
+def validate_config_on_inventory(
+    config,
+    devices,
+    max_sessions=8,
+    timeout=60,
+    retries=1,
+    connect=ConnectHandler,
+    push_method="scp",
+    batch_size=config_batch_size,
+    fragment_cache=False,
+    deadline=None,
+):
+    """
+    Validate the same config on many test devices, with a limited number of concurrent SSH sessions
+
+    :param config: device config as a string
+    :param devices: list of device dictionaries from load_inventory
+    :param max_sessions: maximum number of concurrent sessions
+    :param timeout: per device SSH connection timeout, in seconds
+    :param retries: per device number of retries after a connection error or timeout
+    :param connect: connection factory, Netmiko ConnectHandler or a stand-in with the same interface
+    :param push_method: scp or chunked, see push_config
+    :param batch_size: number of lines per batch for chunked method
+    :param fragment_cache: check only rules not yet validated on the same device model and version
+    :param deadline: per device wall-clock limit in seconds, retries included, None for no limit
+    :return: report dictionary - per device results in inventory order and a summary
+    """
+
+    config_commands = config.splitlines()
+    started = time.perf_counter()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_sessions) as executor:
+        futures = [
+            executor.submit(
+                validate_config_on_device,
+                config_commands,
+                device,
+                timeout,
+                retries,
+                connect,
+                push_method,
+                batch_size,
+                fragment_cache,
+                deadline,
+            )
+            for device in devices
+        ]
+        results = [future.result() for future in futures]
+
+    summary = {"devices": len(results), "passed": 0, "failed": 0, "error": 0}
+    for result in results:
+        summary[result["status"]] += 1
+    summary["total_time"] = round(time.perf_counter() - started, 3)
+
+    return {"summary": summary, "results": results}
+
+
+def print_validation_report(report):
+
+    for result in report["results"]:
+        if result["status"] == "passed":
+            color = Fore.GREEN
+        else:
+            color = Fore.RED
+        details = result.get("error", "")
+        if "fragments" in result:
+            details += f"rules cached: {result['cached']}/{result['fragments']}, commit checks: {result['commit_checks']}"
+        print(
+            color + f"{result['device']:<30} {result['status']:<8} attempts: {result['attempts']} "
+            f"time: {result['timings']['total']}s {details}"
+        )
+        if result["status"] == "failed":
+            print(result["commit_check"])
+
+    summary = report["summary"]
+    print(
+        f"\nDevices: {summary['devices']}, passed: {summary['passed']}, failed: {summary['failed']}, "
+        f"errors: {summary['error']}, total time: {summary['total_time']}s"
+    )
+
+
+def save_validation_report(report):
+    """
+    :param report: report dictionary returned by validate_config_on_inventory
+    :return: file name
+    """
+
+    file_name = f"{output_dir}validation-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.json"
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    with open(file_name, "w") as f:
+        json.dump(report, f, indent=1)
+
+    return file_name
@@ -0,0 +1,151 @@
+import collections
+import contextlib
+import cProfile
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path  # OS-agnostic file handling
+
+from constdefs import *
+
+# Libraries which are imported only when needed, reported as loaded or not
+heavy_modules = ["pandas", "numpy", "openpyxl", "netmiko", "paramiko"]
+
+# Hot path counters, such as catalog lookups. Always counted, as counting is cheap.
+# Only the main process is counted, rules rendered by worker processes with --jobs are not
+counters = collections.Counter()
+
+
+def count(name, value=1):
+    counters[name] += value
+
+
+# --------------------------------------- Classes - ProfileClass ---------------------------------------
+class ProfileClass:
+
+    """ Wall time and peak memory of build stages, such as load, parse, generate.
+    Does nothing unless enabled, so stages can be marked unconditionally
+    """
+
+    def __init__(self, enabled=False, cprofile_stages=()):
+        """
+        :param enabled: record stages
+        :param cprofile_stages: names of stages to run under cProfile, such as generate
+        """
+        self.Enabled = enabled
+        self.CProfileStages = set(cprofile_stages)
+        self.Stages = {}
+        self.CProfileFiles = {}
+        self.Started = time.perf_counter()
+
+        if self.Enabled:
+            counters.clear()
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Record a stage, use as: with profile.stage("load"):
+
+        :param name: stage name
+        """
+        if not self.Enabled:
+            yield
+            return
+
+        profiler = cProfile.Profile() if name in self.CProfileStages else None
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            self.Stages[name] = {
+                "seconds": round(time.perf_counter() - started, 4),
+                "peak_memory": tracemalloc.get_traced_memory()[1],
+            }
+            if profiler:
+                self.CProfileFiles[name] = save_cprofile(profiler, name)
+
+    def add_stage(self, name, seconds):
+        """
+        Record a stage measured before profiling started, such as imports
+
+        :param name: stage name
+        :param seconds: wall time
+        """
+        if self.Enabled:
+            self.Stages[name] = {"seconds": round(seconds, 4), "peak_memory": None}
+
+    def get_report(self):
+        """
+        :return: report dictionary - stages, counters, loaded libraries, total time and cProfile files
+        """
+        return {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "total_seconds": round(time.perf_counter() - self.Started, 4),
+            "stages": self.Stages,
+            "counters": dict(sorted(counters.items())),
+            "modules_loaded": [name for name in heavy_modules if name in sys.modules],
+            "cprofile": self.CProfileFiles,
+        }
+
+    def stop(self):
+        if self.Enabled:
+            tracemalloc.stop()
+
+
+def save_cprofile(profiler, stage_name):
+    """
+    :param profiler: cProfile.Profile object
+    :param stage_name: stage name, used in the file name
+    :return: file name, can be opened with pstats or snakeviz
+    """
+
+    file_name = f"{output_dir}profile-{stage_name}-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.prof"
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(file_name)
+    return file_name
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def print_profile_report(report):
+
+    print(f"{'stage':<12} {'seconds':>10} {'peak MB':>10}")
+    for stage_name, stage in report["stages"].items():
+        peak_memory = "-" if stage["peak_memory"] is None else f"{stage['peak_memory'] / 1024 / 1024:.1f}"
+        print(f"{stage_name:<12} {stage['seconds']:>10.3f} {peak_memory:>10}")
+    print(f"{'total':<12} {report['total_seconds']:>10.3f}")
+
+    print(f"\nLibraries loaded: {', '.join(report['modules_loaded'])}")
+
+    print("\nCounters:")
+    for name, value in report["counters"].items():
+        print(f"  {name:<30} {value}")
+
+    for stage_name, file_name in report["cprofile"].items():
+        print(f"\nTop functions of {stage_name} stage by cumulative time, full profile: {file_name}")
+        pstats.Stats(file_name).sort_stats("cumulative").print_stats(15)
+
+
+def save_profile_report(report):
+    """
+    :param report: report dictionary returned by ProfileClass.get_report
+    :return: file name
+    """
+
+    file_name = f"{output_dir}profile-{datetime.now().strftime('%Y-%m-%d-%H%M%S')}.json"
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    with open(file_name, "w") as f:
+        json.dump(report, f, indent=1)
+
+    return file_name
@@ -0,0 +1,325 @@
+import abc
+
+from classdefs import get_standard_app_registry, parse_network, parse_port_range
+from constdefs import *
+
+# Renderer classes by Network OS name, see register_renderer
+renderers = {}
+_renderer_instances = {}
+
+
+def register_renderer(device_os):
+    """
+    Class decorator to add a renderer for a Network OS
+
+    :param device_os: Network OS name as used in --network-os, such as junos
+    """
+
+    def register(renderer_class):
+        renderers[device_os] = renderer_class
+        return renderer_class
+
+    return register
+
+
+def get_renderer(device_os):
+    """
+    :param device_os: Network OS, such as junos
+    :return: renderer object, created once per process
+    """
+    if device_os not in renderers:
+        print(f"Network OS {device_os} is not supported, supported are: {', '.join(sorted(renderers))}")
+        raise ValueError(f"Unsupported Network OS: {device_os}")
+
+    if device_os not in _renderer_instances:
+        _renderer_instances[device_os] = renderers[device_os]()
+    return _renderer_instances[device_os]
+
+
+def get_policy_name(rule):
+    return rule.Name.replace(" ", "_")
+
+
+# --------------------------------------- Classes - RendererClass ---------------------------------------
+class RendererClass(abc.ABC):
+
+    """ Base class of Network OS renderers.
+    A renderer turns a ResolvedRuleClass object into config lines of one Network OS
+    """
+
+    comment = "#"
+    objects_title = "Address Book"
+
+    def section_header(self, title):
+        return f"\n\n{self.comment} ------------------------ {title} ---------------------------------"
+
+    @abc.abstractmethod
+    def render_rule(self, rule):
+        """
+        :param rule: ResolvedRuleClass object
+        :return: (list of config fragments, list of (object name, object config) tuples).
+            Objects are returned separately, as they are shared between rules
+        """
+
+
+# --------------------------------------- Classes - JunosRendererClass ---------------------------------------
+@register_renderer("junos")
+class JunosRendererClass(RendererClass):
+
+    """ Juniper SRX - global policies, global address book and applications
+    """
+
+    def __init__(self):
+        # Loaded when the renderer is created, so worker processes load it once, see init_batch_worker
+        get_standard_app_registry(junos_app_definitions)
+
+    def render_rule(self, rule):
+
+        fragments = [f"\n# -------- {rule.Description} -------------"]
+        address_entries = []
+        policy_name = get_policy_name(rule)
+
+        if rule.Action == ActionDelete:
+            fragments.append(f"\ndelete security policies global policy {policy_name} ".lower() + "\n")
+
+        elif rule.Action == ActionDeactivate:
+            fragments.append(f"\ndeactivate security policies global policy {policy_name} ".lower() + "\n")
+
+        elif rule.Action == ActionEnable:
+            application_commands, application_names = self.render_applications(rule.Applications)
+            fragments.append(application_commands + "\n")
+            address_entries = self.get_address_entries(rule.Addresses)
+
+            source_addresses = [str(item.name) for item in rule.Addresses if item.direction == "source"]
+            destination_addresses = [str(item.name) for item in rule.Addresses if item.direction == "destination"]
+
+            # set adds to match lists, conditions removed from a changed rule are deleted first.
+            # The policy itself is kept, so it keeps its position
+            if rule.Changed:
+                fragments.append(f"delete security policies global policy {policy_name} match\n".lower())
+
+            result_string = (
+                f"set security policies global"
+                f" policy {policy_name} "
+                f' description "{rule.Description}"'
+                f" match"
+                f" from-zone [{' '.join(rule.SourceZones)}]"
+                f" to-zone [{' '.join(rule.DestinationZones)}]"
+                f" source-address [{' '.join(source_addresses)}]"
+                f" destination-address [{' '.join(destination_addresses)}]"
+                f" application [{' '.join(str(x) for x in application_names)}]"
+                f"\nset security policies global"
+                f" policy {policy_name}"
+                f" then {rule.RuleAction}"
+                f"\nactivate security policies global"
+                f" policy {policy_name}"
+            )
+            fragments.append(result_string.lower() + "\n")
+
+        return fragments, address_entries
+
+    def render_applications(self, applications):
+        """
+        Applications already defined in Network OS, such as junos-https, are used by name, others are defined
+
+        :param applications: ApplicationEntry objects
+        :return: (application config lines, list of application names used by the policy)
+        """
+
+        application_commands = []
+        application_names = []
+        # Renderer is kept for the whole process, the registry is reloaded if the file has changed
+        standard_apps = get_standard_app_registry(junos_app_definitions)
+
+        for item in applications:
+            # match app by protocol and port number or range,
+            # or if Port is 0, so no TCP or UDP protocol, match by name
+            app_name = standard_apps.lookup(item.Protocol, item.DestinationPort, item.Name)
+
+            if app_name:
+                application_names.append(app_name)
+            else:
+                application_names.append(item.Name)
+                application_commands.append(
+                    f"\nset applications application {item.Name} protocol {item.Protocol} "
+                    f"destination-port {item.DestinationPort}"
+                )
+
+        return "".join(application_commands).lower(), application_names
+
+    def get_address_entries(self, addresses):
+        """
+        :param addresses: AddressEntry objects
+        :return: list of (object name, config line) tuples, to be deduplicated across all rules
+        """
+
+        address_book_entry_command = []
+
+        for item in addresses:
+            if item.members is not None:
+                address_book_entry_command.extend(self.get_address_entry(member) for member in item.members)
+                address_book_entry_command.append(
+                    (
+                        item.name,
+                        "\n".join(
+                            f"set security address-book global address-set {item.name} address {member.name}"
+                            for member in sorted(item.members, key=lambda member: str(member.name).lower())
+                        ),
+                    )
+                )
+            else:
+                address_book_entry_command.append(self.get_address_entry(item))
+
+        return [
+            (str(name).lower(), str(command).lower()) for name, command in address_book_entry_command if command
+        ]
+
+    def get_address_entry(self, item):
+        """
+        :param item: AddressEntry object
+        :return: (object name, config line) tuple, config line is None for any
+        """
+        try:
+            if parse_network(item.value).is_global or parse_network(item.value).is_private:
+                return item.name, f"set security address-book global address {item.name} {item.value}"
+        except ValueError:
+            if item.name != "any":
+                return item.name, f"set security address-book global address {item.name} dns-name {item.value}"
+        return item.name, None
+
+
+# --------------------------------------- Classes - AsaRendererClass ---------------------------------------
+@register_renderer("asa")
+class AsaRendererClass(RendererClass):
+
+    """ Cisco ASA - network and service objects, one extended access list per source zone, named <zone>-in.
+    Destination zones are kept in the remark, as ASA access lists are applied to the ingress interface.
+    Rules to delete or deactivate are listed as comments, ASA access list entries have no names
+    """
+
+    comment = "!"
+    objects_title = "Objects"
+
+    def render_rule(self, rule):
+
+        fragments = [f"\n! -------- {rule.Description} -------------"]
+        policy_name = get_policy_name(rule).lower()
+
+        if rule.Action != ActionEnable:
+            fragments.append(f"\n! {rule.Action} policy {policy_name}: remove access list entries with this remark\n")
+            return fragments, []
+
+        object_entries = []
+        sources = self.get_network_reference(
+            [item for item in rule.Addresses if item.direction == "source"], f"{policy_name}-src", object_entries
+        )
+        destinations = self.get_network_reference(
+            [item for item in rule.Addresses if item.direction == "destination"], f"{policy_name}-dst", object_entries
+        )
+        services = self.get_service_reference(rule.Applications, f"{policy_name}-svc", object_entries)
+        action = "permit" if str(rule.RuleAction).lower() == "permit" else "deny"
+
+        for zone in rule.SourceZones:
+            fragments.append(
+                f"\naccess-list {zone}-in remark {policy_name} to {' '.join(rule.DestinationZones)}: {rule.Description}"
+                f"\naccess-list {zone}-in extended {action} {services} {sources} {destinations}"
+            )
+        fragments.append("\n")
+
+        return fragments, [(name.lower(), command) for name, command in object_entries]
+
+    def get_network_reference(self, items, group_name, object_entries):
+        """
+        :param items: AddressEntry objects of one direction
+        :param group_name: object group name, if there's more than one object
+        :param object_entries: list to add (object name, object config) tuples to
+        :return: reference in access list entry - any, object or object-group
+        :raises ValueError: if no network can be configured
+        """
+
+        names = []
+        for item in items:
+            if item.name == "any":
+                return "any"
+            if item.members is not None:
+                for member in item.members:
+                    object_entries.append(self.get_network_object(member))
+                object_entries.append(
+                    (
+                        item.name,
+                        f"object-group network {item.name}"
+                        + "".join(
+                            f"\n network-object object {str(member.name).lower()}"
+                            for member in sorted(item.members, key=lambda member: str(member.name).lower())
+                        ),
+                    )
+                )
+                if len(items) == 1:
+                    return f"object-group {item.name}"
+                names.append(f"group-object {item.name}")
+            else:
+                object_entries.append(self.get_network_object(item))
+                names.append(f"network-object object {str(item.name).lower()}")
+
+        if not names:
+            # All networks were dropped, see get_network_entry - any would permit more than the rule
+            print(f"Access list {group_name} has no networks which can be configured, check the rule networks")
+            raise ValueError(f"No networks to configure: {group_name}")
+        if len(names) == 1 and names[0].startswith("network-object"):
+            return f"object {names[0].split()[-1]}"
+
+        object_entries.append((group_name, f"object-group network {group_name}" + "".join(f"\n {name}" for name in names)))
+        return f"object-group {group_name}"
+
+    def get_network_object(self, item):
+        """
+        :param item: AddressEntry object
+        :return: (object name, object config) tuple
+        """
+        name = str(item.name).lower()
+        try:
+            network = parse_network(item.value)
+        except ValueError:
+            return name, f"object network {name}\n fqdn {item.value}"
+
+        if network.prefixlen == 32:
+            return name, f"object network {name}\n host {network.network_address}"
+        return name, f"object network {name}\n subnet {network.network_address} {network.netmask}"
+
+    def get_service_reference(self, applications, group_name, object_entries):
+        """
+        :param applications: ApplicationEntry objects
+        :param group_name: object group name, if there's more than one service
+        :param object_entries: list to add (object name, object config) tuples to
+        :return: reference in access list entry - object or object-group
+        :raises ValueError: if there are no applications, or a tcp or udp application has no port
+        """
+
+        names = []
+        for item in applications:
+            name = str(item.Name).lower()
+            port = str(item.DestinationPort)
+            if str(item.Protocol).lower() in ("tcp", "udp") and parse_port_range(port) in (None, (0, 0)):
+                # service tcp or service udp alone would permit all ports
+                print(f"Application {item.Name} has protocol {item.Protocol} without a port, define its port")
+                raise ValueError(f"Application without port: {item.Name}")
+            if port in ("", "0"):
+                command = f"object service {name}\n service {item.Protocol}"
+            elif "-" in port:
+                command = f"object service {name}\n service {item.Protocol} destination range {port.replace('-', ' ')}"
+            else:
+                command = f"object service {name}\n service {item.Protocol} destination eq {port}"
+            object_entries.append((name, command.lower()))
+            names.append(name)
+
+        if not names:
+            # ip would permit all protocols and ports
+            print(f"Access list {group_name} has no applications, check the rule ports and applications")
+            raise ValueError(f"No applications to configure: {group_name}")
+        if len(names) == 1:
+            return f"object {names[0]}"
+
+        object_entries.append(
+            (group_name, f"object-group service {group_name}" + "".join(f"\n service-object object {name}" for name in names))
+        )
+        return f"object-group {group_name}"
@@ -0,0 +1,307 @@
+import collections
+import os
+import re
+
+from constdefs import *
+
+# Policy match conditions and actions which are generated, and can have several values.
+# Other policy settings found on the device, such as logging, are kept as is
+policy_list_keys = {
+    "match from-zone",
+    "match to-zone",
+    "match source-address",
+    "match destination-address",
+    "match application",
+    "then",
+}
+policy_actions = {"permit", "deny", "reject"}
+
+token_pattern = re.compile(r'"[^"]*"|[\[\]]|[^\s\[\]"]+')
+
+
+def tokenize(statement):
+    """
+    :param statement: config statement, such as: set ... description "some text" match from-zone [a b]
+    :return: list of tokens, quotes removed from quoted values, brackets are separate tokens
+    """
+    if '"' not in statement and "[" not in statement:
+        # Most lines of display set output
+        return statement.split()
+    return [token.strip('"') for token in token_pattern.findall(statement)]
+
+
+def quote(value):
+    return f'"{value}"' if " " in value or value == "" else value
+
+
+# --------------------------------------- Classes - RunningConfigClass ---------------------------------------
+class RunningConfigClass:
+
+    """ Objects of a Junos config in display set format, indexed by name -
+    global address book addresses and address sets, applications, global policies
+    """
+
+    def __init__(self):
+        self.Addresses = {}
+        self.AddressSets = collections.defaultdict(set)
+        self.Applications = collections.defaultdict(dict)
+        # policy name -> key -> set of values, for single value keys, such as description, the set has one value
+        self.Policies = collections.defaultdict(lambda: collections.defaultdict(set))
+        self.InactivePolicies = set()
+
+    def add_statement(self, statement):
+        """
+        Add a set or deactivate statement. Statements of other objects are ignored
+
+        :param statement: config line
+        """
+
+        tokens = tokenize(statement.lower())
+        if len(tokens) < 6:
+            return
+
+        if tokens[:4] == ["set", "security", "address-book", "global"]:
+            if tokens[4] == "address" and len(tokens) > 6 and tokens[6] != "description":
+                self.Addresses[tokens[5]] = " ".join(tokens[6:])
+            elif tokens[4] == "address-set" and len(tokens) > 7 and tokens[6] == "address":
+                self.AddressSets[tokens[5]].add(tokens[7])
+
+        elif tokens[:3] == ["set", "applications", "application"]:
+            for key, value in zip(tokens[4::2], tokens[5::2]):
+                self.Applications[tokens[3]][key] = value
+
+        elif tokens[1:5] == ["security", "policies", "global", "policy"]:
+            if tokens[0] == "set":
+                policy = self.Policies[tokens[5]]
+                for key, value in parse_policy_settings(tokens[6:]):
+                    if key not in policy_list_keys:
+                        policy[key].clear()
+                    policy[key].add(value)
+            elif tokens[0] == "deactivate" and len(tokens) == 6:
+                self.InactivePolicies.add(tokens[5])
+
+
+def parse_policy_settings(tokens):
+    """
+    :param tokens: policy statement tokens after policy name, such as: match from-zone [ a b ] then permit
+    :return: list of (key, value) tuples, such as ("match from-zone", "a"), ("then", "permit")
+    """
+
+    settings = []
+    container = ""
+    position = 0
+
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+
+        if token in ("match", "then"):
+            container = token
+        elif container == "then" and token in policy_actions:
+            settings.append(("then", token))
+        elif position < len(tokens):
+            key = f"{container} {token}".strip()
+            if tokens[position] == "[":
+                end = tokens.index("]", position) if "]" in tokens[position:] else len(tokens)
+                settings.extend((key, value) for value in tokens[position + 1 : end])
+                position = end + 1
+            else:
+                settings.append((key, tokens[position]))
+                position += 1
+
+    return settings
+
+
+def load_running_config(filename):
+    """
+    :param filename: saved output of show configuration | display set
+    :return: RunningConfigClass object
+    """
+
+    running_config = RunningConfigClass()
+    with open(filename, "r") as f:
+        for line in f:
+            running_config.add_statement(line)
+    return running_config
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def diff_statements(statements, running_config, summary):
+    """
+    Compare generated statements of one rule or of the address book with the running config
+
+    :param statements: generated config lines, without comments
+    :param running_config: RunningConfigClass object, updated with emitted statements
+    :param summary: counters of emitted, unchanged and deleted statements
+    :return: list of statements which add or change something, deletes first
+    """
+
+    deletes = []
+    sets = []
+
+    # Generated address sets, to delete members which are not generated anymore
+    address_sets = collections.defaultdict(set)
+
+    for statement in statements:
+        tokens = tokenize(statement)
+        if len(tokens) < 6:
+            sets.append(statement)
+            continue
+
+        if tokens[:5] == ["set", "security", "address-book", "global", "address"]:
+            value = " ".join(tokens[6:])
+            if running_config.Addresses.get(tokens[5]) == value:
+                summary["unchanged"] += 1
+            else:
+                running_config.Addresses[tokens[5]] = value
+                sets.append(statement)
+
+        elif tokens[:5] == ["set", "security", "address-book", "global", "address-set"] and len(tokens) > 7:
+            address_sets[tokens[5]].add(tokens[7])
+            if tokens[7] in running_config.AddressSets.get(tokens[5], ()):
+                summary["unchanged"] += 1
+            else:
+                running_config.AddressSets[tokens[5]].add(tokens[7])
+                sets.append(statement)
+
+        elif tokens[:3] == ["set", "applications", "application"]:
+            application = running_config.Applications.get(tokens[3], {})
+            settings = dict(zip(tokens[4::2], tokens[5::2]))
+            if all(application.get(key) == value for key, value in settings.items()):
+                summary["unchanged"] += 1
+            else:
+                running_config.Applications[tokens[3]].update(settings)
+                sets.append(statement)
+
+        elif tokens[:5] == ["set", "security", "policies", "global", "policy"]:
+            deletes_and_sets = diff_policy(tokens[5], parse_policy_settings(tokens[6:]), running_config, summary)
+            deletes.extend(deletes_and_sets[0])
+            sets.extend(deletes_and_sets[1])
+
+        elif tokens[1:5] == ["security", "policies", "global", "policy"]:
+            # activate, deactivate or delete a policy
+            name = tokens[5]
+            exists = name in running_config.Policies
+            inactive = name in running_config.InactivePolicies
+            if (
+                (tokens[0] == "activate" and exists and not inactive)
+                or (tokens[0] == "deactivate" and (not exists or inactive))
+                or (tokens[0] == "delete" and not exists)
+            ):
+                summary["unchanged"] += 1
+                continue
+            if tokens[0] == "delete":
+                running_config.Policies.pop(name, None)
+                running_config.InactivePolicies.discard(name)
+                deletes.append(statement)
+                continue
+            if tokens[0] == "activate":
+                running_config.InactivePolicies.discard(name)
+            elif tokens[0] == "deactivate":
+                running_config.InactivePolicies.add(name)
+            sets.append(statement)
+
+        else:
+            sets.append(statement)
+
+    for name, members in address_sets.items():
+        for member in sorted(running_config.AddressSets.get(name, set()) - members):
+            running_config.AddressSets[name].discard(member)
+            deletes.append(f"delete security address-book global address-set {name} address {member}")
+
+    summary["deleted"] += len(deletes)
+    summary["emitted"] += len(sets)
+    return deletes + sets
+
+
+def diff_policy(name, settings, running_config, summary):
+    """
+    :param name: policy name
+    :param settings: generated (key, value) settings of the policy
+    :param running_config: RunningConfigClass object, updated with emitted statements
+    :param summary: counters of unchanged statements
+    :return: (list of delete statements, list of set statements), one statement per value
+    """
+
+    prefix = f"security policies global policy {name}"
+    policy = running_config.Policies.get(name, {})
+    # Values are kept in the generated order, dictionary keys are used as an ordered set
+    generated = collections.defaultdict(dict)
+    for key, value in settings:
+        generated[key][value] = None
+
+    deletes = []
+    sets = []
+    for key, values in generated.items():
+        running_values = policy.get(key, set())
+        if key in policy_list_keys:
+            deletes.extend(f"delete {prefix} {key} {quote(value)}" for value in sorted(running_values - values.keys()))
+        for value in values:
+            if value in running_values and (key in policy_list_keys or len(running_values) == 1):
+                summary["unchanged"] += 1
+            else:
+                sets.append(f"set {prefix} {key} {quote(value)}")
+
+    running_policy = running_config.Policies[name]
+    for key, values in generated.items():
+        running_policy[key] = set(values)
+
+    return deletes, sets
+
+
+def iter_running_config_delta(config_lines, running_config, summary):
+    """
+    Filter generated junos config down to statements which add or change something on the device,
+    and deletes of values which are not generated anymore.
+    Comments of rules without remaining statements are removed
+
+    :param config_lines: generated config lines
+    :param running_config: RunningConfigClass object
+    :param summary: dictionary of counters - emitted, unchanged, deleted
+    :return: generator of config lines
+    """
+
+    block = []
+
+    def flush():
+        # A block is a section header or a rule comment, followed by its statements
+        statements = diff_statements([line for line in block[1:] if line.strip()], running_config, summary)
+        if statements or (block and block[0].startswith("# ------------------------ ")):
+            yield from block[:1]
+            yield from statements
+            yield ""
+
+    for line in config_lines:
+        line = line.rstrip("\n")
+        if line.startswith("#"):
+            if block:
+                yield from flush()
+            block = [line]
+        elif block:
+            block.append(line)
+        elif line.strip():
+            block = ["", line]
+
+    if block:
+        yield from flush()
+
+
+def write_running_config_delta(file_name, delta_file_name, running_config):
+    """
+    :param file_name: generated junos config
+    :param delta_file_name: file to save statements which are not yet on the device
+    :param running_config: RunningConfigClass object
+    :return: summary dictionary - numbers of emitted, unchanged and deleted statements
+    """
+
+    summary = collections.Counter(emitted=0, unchanged=0, deleted=0)
+    temp_file_name = f"{delta_file_name}.tmp"
+
+    with open(file_name, "r") as source, open(temp_file_name, "w") as f:
+        for line in iter_running_config_delta(source, running_config, summary):
+            f.write(line + "\n")
+    os.replace(temp_file_name, delta_file_name)
+
+    return dict(summary)
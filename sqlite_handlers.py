@@ -0,0 +1,211 @@
+import itertools
+import json
+import os
+import sqlite3
+
+from classdefs import CatalogClass, split_field
+from constdefs import *
+from data_handlers import build_catalog_from_rows, flow_column_names, get_action_list, parse_flow_row, select_columns
+
+# Columns have no type, so values are kept as read from the workbook, such as port numbers as integers
+# Rules are inserted in batches, so a workbook with millions of flows is never held in memory
+import_batch_size = 10000
+
+schema = """
+CREATE TABLE meta (key PRIMARY KEY, value);
+CREATE TABLE zones (name PRIMARY KEY, zone_set);
+CREATE TABLE applications (name PRIMARY KEY, protocol, port);
+CREATE TABLE address_book (name PRIMARY KEY, network);
+CREATE TABLE flows (
+    row INTEGER PRIMARY KEY,
+    name,
+    description,
+    protocol,
+    source_zone,
+    source_network,
+    destination_zone,
+    destination_network,
+    destination_port,
+    rule_action,
+    enable,
+    delete_flag
+);
+CREATE TABLE flow_zone_pairs (row INTEGER, source_zone, destination_zone);
+CREATE TABLE flow_addresses (row INTEGER, direction, address);
+CREATE TABLE flow_applications (row INTEGER, application);
+"""
+
+# Created after rules are imported, bulk insert is faster without indexes
+indexes = """
+CREATE INDEX flows_name ON flows (name);
+CREATE INDEX flow_zone_pairs_zones ON flow_zone_pairs (source_zone, destination_zone, row);
+CREATE INDEX flow_addresses_address ON flow_addresses (address, row);
+CREATE INDEX flow_applications_application ON flow_applications (application, row);
+"""
+
+
+def import_source(source_filename, db_filename):
+    """
+    Import a workbook into a new SQLite store, replacing the previous one.
+    Sheets are read row by row, rules are indexed by name, zone pair, address and application.
+    Zone sets are expanded, so a rule is found by any zone pair it matches
+
+    :param source_filename: source Excel file
+    :param db_filename: SQLite file
+    :return: number of imported Traffic Flows rows
+    """
+
+    import openpyxl
+
+    # Built next to the store and renamed when complete, so readers never see a partial import
+    temp_filename = f"{db_filename}.{os.getpid()}.tmp"
+    if os.path.exists(temp_filename):
+        os.remove(temp_filename)
+
+    workbook = openpyxl.load_workbook(source_filename, read_only=True, data_only=True)
+    connection = sqlite3.connect(temp_filename)
+    imported = False
+    try:
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(schema)
+
+        def iter_sheet(sheet_name):
+            return workbook[sheet_name].iter_rows(values_only=True)
+
+        zones = list(select_columns(iter_sheet(zones_sheet_name), [ZoneNameColumnName, ZoneSetColumnName]))
+        applications = list(
+            select_columns(
+                iter_sheet(standard_apps_sheet_name),
+                [ApplicationColumnName, ApplicationProtocolColumnName, ApplicationPortColumnName],
+            )
+        )
+        address_book = list(
+            select_columns(
+                iter_sheet(address_book_sheet_name), [AddressBookEntryColumnName, AddressBookNetworkColumnName]
+            )
+        )
+        # Also reports duplicates and is used to expand zone sets
+        catalog = CatalogClass(zones=zones, applications=applications, address_book=address_book)
+
+        connection.executemany("INSERT OR REPLACE INTO zones VALUES (?, ?)", zones)
+        connection.executemany("INSERT OR REPLACE INTO applications VALUES (?, ?, ?)", applications)
+        connection.executemany("INSERT OR REPLACE INTO address_book VALUES (?, ?)", address_book)
+
+        flows_headers = next(iter_sheet(traffic_flows_sheet_name), ())
+        connection.execute(
+            "INSERT INTO meta VALUES ('flows_headers', ?)",
+            (json.dumps([str(header) for header in flows_headers if header is not None]),),
+        )
+
+        row_count = 0
+        rows = enumerate(select_columns(iter_sheet(traffic_flows_sheet_name), flow_column_names), 2)
+        while True:
+            batch = list(itertools.islice(rows, import_batch_size))
+            if not batch:
+                break
+            row_count += len(batch)
+
+            connection.executemany(
+                f"INSERT INTO flows VALUES ({', '.join('?' * (len(flow_column_names) + 1))})",
+                ((row_number, *row) for row_number, row in batch),
+            )
+            connection.executemany(
+                "INSERT INTO flow_zone_pairs VALUES (?, ?, ?)",
+                (
+                    (row_number, source_zone, destination_zone)
+                    for row_number, row in batch
+                    for source_zone in catalog.get_zone_set(row[3]) or [row[3]]
+                    for destination_zone in catalog.get_zone_set(row[5]) or [row[5]]
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO flow_addresses VALUES (?, ?, ?)",
+                (
+                    (row_number, direction, address)
+                    for row_number, row in batch
+                    for direction, value in (("source", row[4]), ("destination", row[6]))
+                    for address in split_field(value)
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO flow_applications VALUES (?, ?)",
+                ((row_number, application) for row_number, row in batch for application in split_field(row[7])),
+            )
+
+        connection.executescript(indexes)
+        connection.commit()
+        imported = True
+    finally:
+        connection.close()
+        workbook.close()
+        if not imported:
+            # The previous store is kept as it was
+            os.remove(temp_filename)
+
+    os.replace(temp_filename, db_filename)
+    return row_count
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def read_store(db_filename, zone_pair=None, address=None, name=None):
+    """
+    Same as stream_source, for rules imported into a SQLite store.
+    Filters use indexes, so a subset of rules is read without reading the others
+
+    :param db_filename: SQLite file created by import_source
+    :param zone_pair: (source zone, destination zone) tuple, only rules which match it, zone sets included
+    :param address: only rules with this address object or network in sources or destinations
+    :param name: only rules with this Flow Name
+    :return: (CatalogClass object, action list, generator of AccessRuleClass objects in Traffic Flows order)
+    """
+
+    if not os.path.exists(db_filename):
+        print(f"SQLite store {db_filename} not found, import a workbook with --source and --sqlite first")
+        raise ValueError(f"SQLite store not found: {db_filename}")
+
+    connection = sqlite3.connect(db_filename)
+
+    def iter_table(columns, table):
+        # Headers first, as in sheets
+        return itertools.chain([tuple(columns)], connection.execute(f"SELECT * FROM {table}"))
+
+    catalog = build_catalog_from_rows(
+        {
+            zones_sheet_name: iter_table([ZoneNameColumnName, ZoneSetColumnName], "zones"),
+            standard_apps_sheet_name: iter_table(
+                [ApplicationColumnName, ApplicationProtocolColumnName, ApplicationPortColumnName], "applications"
+            ),
+            address_book_sheet_name: iter_table(
+                [AddressBookEntryColumnName, AddressBookNetworkColumnName], "address_book"
+            ),
+        }
+    )
+    flows_headers = connection.execute("SELECT value FROM meta WHERE key = 'flows_headers'").fetchone()
+    action_list = get_action_list(json.loads(flows_headers[0]) if flows_headers else [])
+
+    conditions = []
+    parameters = []
+    if zone_pair:
+        conditions.append("row IN (SELECT row FROM flow_zone_pairs WHERE source_zone = ? AND destination_zone = ?)")
+        parameters.extend(zone_pair)
+    if address:
+        conditions.append("row IN (SELECT row FROM flow_addresses WHERE address = ?)")
+        parameters.append(address)
+    if name:
+        conditions.append("name = ?")
+        parameters.append(name)
+    query = "SELECT * FROM flows" + (" WHERE " + " AND ".join(conditions) if conditions else "") + " ORDER BY row"
+
+    def iter_rules():
+        try:
+            # Cursor fetches rows as they are read
+            for row_number, *row in connection.execute(query, parameters):
+                acl = parse_flow_row(row, row_number)
+                if acl is not None:
+                    yield acl
+        finally:
+            connection.close()
+
+    return catalog, action_list, iter_rules()
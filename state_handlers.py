@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+from pathlib import Path  # OS-agnostic file handling
+
+from classdefs import AccessRuleClass
+from constdefs import *
+
+# Bump when rendering changes in a way that invalidates previously saved fingerprints
+state_format_version = 1
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def get_policy_name(acl):
+    # Policy name as it appears on the device
+    return acl.Name.replace(" ", "_").lower()
+
+
+def fingerprint_rule(acl, catalog):
+    """
+    Fingerprint a rule together with the catalog entries it references,
+    so a change of an address object, application or zone set marks the rule as changed
+
+    :param acl: AccessRuleClass object
+    :param catalog: CatalogClass object
+    :return: hex digest
+    """
+
+    networks = acl.SourceNetworkAndMask + acl.DestinationNetworkAndMask
+
+    fields = [
+        acl.Name,
+        acl.Description,
+        acl.Action,
+        acl.Protocol,
+        acl.SourceZone,
+        acl.DestinationZone,
+        acl.RuleAction,
+        acl.SourceNetworkAndMask,
+        acl.DestinationNetworkAndMask,
+        acl.DestinationPort,
+        catalog.get_zone_set(acl.SourceZone),
+        catalog.get_zone_set(acl.DestinationZone),
+        [catalog.AddressBook.get(address) for address in networks],
+        [catalog.Applications.get(port_or_app) for port_or_app in acl.DestinationPort],
+    ]
+
+    return hashlib.sha256(json.dumps(fields, default=str).encode()).hexdigest()
+
+
+def get_context_fingerprint(device_os):
+    """
+    Anything besides the workbook which changes the generated config - Network OS and standard applications.
+    If it changes, all rules are rebuilt
+
+    :param device_os: Network OS, such as junos
+    :return: hex digest
+    """
+
+    context = hashlib.sha256(f"{state_format_version}:{device_os}:".encode())
+    with open(junos_app_definitions, "rb") as f:
+        context.update(f.read())
+
+    return context.hexdigest()
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def load_state(state_filename):
+    """
+    :param state_filename: JSON state file saved by save_state
+    :return: state dictionary, empty if the file does not exist
+    """
+
+    try:
+        with open(state_filename, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(state, state_filename):
+    # Write to a temporary file first, so interrupted run doesn't leave a broken state
+    Path(state_filename).parent.mkdir(parents=True, exist_ok=True)
+    temp_filename = f"{state_filename}.tmp"
+
+    with open(temp_filename, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(temp_filename, state_filename)
+
+
+def diff_rules(acl_list, catalog, device_os, previous_state):
+    """
+    Compare rules with the state of the previous run
+
+    :param acl_list: list of AccessRuleClass objects
+    :param catalog: CatalogClass object
+    :param device_os: Network OS, such as junos
+    :param previous_state: state dictionary returned by load_state
+    :return: (list of rules to render, new state, summary dictionary)
+        rules removed from the source since the previous run are returned as Delete rules,
+        changed rules are marked as Changed, so their match conditions are replaced
+    """
+
+    context = get_context_fingerprint(device_os)
+    previous_rules = previous_state.get("rules", {}) if previous_state.get("context") == context else {}
+
+    rules = {}
+    delta_acl_list = []
+    summary = {"new": 0, "changed": 0, "unchanged": 0, "removed": 0}
+
+    for acl in acl_list:
+        key = get_policy_name(acl)
+        # Same Flow Name used more than once
+        duplicate = 1
+        while key in rules:
+            duplicate += 1
+            key = f"{get_policy_name(acl)}#{duplicate}"
+
+        fingerprint = fingerprint_rule(acl, catalog)
+        rules[key] = {"fingerprint": fingerprint, "action": acl.Action}
+
+        if key not in previous_rules:
+            summary["new"] += 1
+            delta_acl_list.append(acl)
+        elif previous_rules[key]["fingerprint"] != fingerprint:
+            summary["changed"] += 1
+            acl.Changed = True
+            delta_acl_list.append(acl)
+        else:
+            summary["unchanged"] += 1
+
+    for key, previous_rule in previous_rules.items():
+        if key in rules or "#" in key or previous_rule["action"] == ActionDelete:
+            continue
+        summary["removed"] += 1
+        delta_acl_list.append(
+            AccessRuleClass(Name=key, Description=f"{key} removed from {traffic_flows_sheet_name}", Action=ActionDelete)
+        )
+
+    new_state = {"context": context, "device_os": device_os, "rules": rules}
+
+    return delta_acl_list, new_state, summary
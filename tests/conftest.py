@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules are at the top of the repository, next to fw_build.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,65 @@
+import threading
+
+
+class FakeConnectionClass:
+
+    """ Stand-in for a Netmiko connection to an SRX, with the methods network_handlers uses.
+    Statements are kept until rollback, commit check fails when is_invalid returns True for them
+    """
+
+    def __init__(
+        self, is_invalid=lambda statements: False, commit_check_delay=0, load_output="", **connection_parameters
+    ):
+        self.IsInvalid = is_invalid
+        self.CommitCheckDelay = commit_check_delay
+        self.LoadOutput = load_output
+        self.DeletedFiles = []
+        self.Statements = []
+        self.CommitChecks = 0
+        self.Disconnected = False
+        self.Closed = threading.Event()
+
+    def send_command(self, command, **kwargs):
+        if command == "show version":
+            return "Model: vsrx\nJunos: 19.4R1.10\n"
+        if command.startswith("rollback"):
+            self.Statements = []
+        return ""
+
+    def send_config_set(self, commands, exit_config_mode=True, **kwargs):
+        if isinstance(commands, str):
+            commands = [commands]
+        if commands == ["commit check"]:
+            self.CommitChecks += 1
+            # A closed session stops a command which is waiting for output
+            if self.Closed.wait(self.CommitCheckDelay):
+                raise OSError("Socket is closed")
+            if self.IsInvalid(self.Statements):
+                return "error: configuration check-out failed"
+            return "configuration check succeeds"
+        if commands == ["show | compare"]:
+            return ""
+        if commands[0].startswith("load set "):
+            return self.LoadOutput
+        if commands[0].startswith("run file delete "):
+            self.DeletedFiles.append(commands[0].split()[-1])
+            return ""
+        self.Statements.extend(commands)
+        return ""
+
+    def disconnect(self):
+        self.Disconnected = True
+        self.Closed.set()
+
+
+def get_connect(**fake_parameters):
+    """
+    :return: connection factory for validate_config_on_device, returns the same fake connection every time
+    """
+    connection = FakeConnectionClass(**fake_parameters)
+
+    def connect(**connection_parameters):
+        return connection
+
+    connect.Connection = connection
+    return connect
@@ -0,0 +1,83 @@
+import openpyxl
+
+from classdefs import CatalogClass
+from constdefs import *
+from data_handlers import flow_column_names, parse_flow_row
+
+
+def get_catalog(applications=()):
+    return CatalogClass(
+        zones=[("dmz1", "dmz1"), ("dmz2", "dmz2"), ("internal", "dmz1, dmz2")],
+        applications=[("https", "tcp", 443), ("ntp", "udp", 123), ("ospf", "ospf", 0), *applications],
+        address_book=[("web", "10.0.1.10/32"), ("db", "10.0.2.0/24")],
+    )
+
+
+def get_rule(
+    name,
+    source="web",
+    destination="db",
+    port="https",
+    action="Permit",
+    enable="Yes",
+    delete="No",
+    row=2,
+    source_zone="dmz1",
+    destination_zone="dmz2",
+):
+    return parse_flow_row(
+        (name, f"{name} rule", "tcp", source_zone, source, destination_zone, destination, port, action, enable, delete),
+        row,
+    )
+
+
+def write_workbook(file_name, rules):
+    """
+    :param file_name: xlsx file to create, with the sheets of get_catalog
+    :param rules: list of Traffic Flows rows, in flow_column_names order
+    """
+
+    catalog = get_catalog()
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    sheets = {
+        traffic_flows_sheet_name: [flow_column_names] + [list(rule) for rule in rules],
+        zones_sheet_name: [[ZoneNameColumnName, ZoneSetColumnName]]
+        + [[name, ", ".join(zone_set)] for name, zone_set in catalog.Zones.items()],
+        standard_apps_sheet_name: [[ApplicationColumnName, ApplicationProtocolColumnName, ApplicationPortColumnName]]
+        + [[name, protocol, port] for name, (protocol, port) in catalog.Applications.items()],
+        address_book_sheet_name: [[AddressBookEntryColumnName, AddressBookNetworkColumnName]]
+        + [list(entry) for entry in catalog.AddressBook.items()],
+    }
+    for sheet_name, rows in sheets.items():
+        sheet = workbook.create_sheet(sheet_name)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(file_name)
+
+
+def get_flow_rows(count):
+    """
+    :param count: number of rows
+    :return: list of Traffic Flows rows for write_workbook - enabled, deactivated, deleted rules and rows without action
+    """
+
+    rows = []
+    for number in range(count):
+        enable, delete = [("Yes", "No"), ("No", "No"), ("Yes", "Yes"), ("Yes", "No"), ("", "")][number % 5]
+        rows.append(
+            (
+                f"rule{number}",
+                f"rule {number}",
+                "tcp",
+                ["dmz1", "internal"][number % 2],
+                ["web", f"10.1.{number}.0/24", "any"][number % 3],
+                "dmz2",
+                f"db, 10.2.{number % 4}.0/25",
+                ["https", f"{8000 + number}", "ntp, 22-23"][number % 3],
+                ["Permit", "Deny"][number % 2],
+                enable,
+                delete,
+            )
+        )
+    return rows
@@ -0,0 +1,141 @@
+import csv
+import random
+
+import pytest
+
+from analysis_handlers import (
+    FlowLookupClass,
+    RuleMatchClass,
+    analyze_rules,
+    check_references,
+    query_columns,
+    query_flows,
+)
+from constdefs import *
+from sample_rules import get_catalog, get_rule
+
+
+def test_any_application_must_be_defined():
+    report = check_references([get_rule("r1", port="any")], get_catalog(), ["junos"])
+    assert [(error["value"], error["message"]) for error in report["errors"]] == [
+        ("any", "application is not defined in sheet Applications")
+    ]
+
+    catalog = get_catalog(applications=[("any", "tcp", "1-65535")])
+    assert check_references([get_rule("r1", port="any")], catalog, ["junos"])["errors"] == []
+
+
+def get_brute_force_report(acl_list, catalog):
+    # Each enabled rule is compared with every earlier enabled rule
+    rules = [RuleMatchClass(acl, catalog) for acl in acl_list if acl.Action == ActionEnable]
+    shadowed = []
+    redundant = []
+    for rule_id, rule in enumerate(rules):
+        covering_rule = next((earlier for earlier in rules[:rule_id] if earlier.covers(rule)), None)
+        if covering_rule is None:
+            continue
+        if covering_rule.RuleAction == rule.RuleAction:
+            redundant.append({"rule": rule.Name, "covered_by": covering_rule.Name})
+        else:
+            shadowed.append(
+                {
+                    "rule": rule.Name,
+                    "covered_by": covering_rule.Name,
+                    "action": rule.RuleAction,
+                    "covered_by_action": covering_rule.RuleAction,
+                }
+            )
+    return shadowed, redundant
+
+
+def test_covered_rules():
+    acl_list = [
+        get_rule("r1", source="10.0.0.0/8", port="400-500"),
+        get_rule("r2", port="https", action="Deny"),
+        get_rule("r3", source="any", destination="any", port="any", source_zone="internal"),
+        get_rule("r4", source="web, 10.1.0.0/16", port="443, 450-460", source_zone="dmz2", destination_zone="dmz2"),
+        get_rule("r5", source="10.0.0.0/8", port="400-501"),
+    ]
+    report = analyze_rules(acl_list, get_catalog())
+
+    assert report["shadowed"] == [
+        {"rule": "r2", "covered_by": "r1", "action": "Deny", "covered_by_action": "Permit"}
+    ]
+    assert report["redundant"] == [
+        {"rule": "r4", "covered_by": "r3"},
+        {"rule": "r5", "covered_by": "r3"},
+    ]
+
+
+def test_covered_rules_match_brute_force():
+    catalog = get_catalog()
+    generator = random.Random(1)
+    addresses = ["any", "web", "db", "10.0.0.0/8", "10.0.1.0/24", "10.0.2.128/25", "192.168.0.0/16"]
+    ports = ["any", "https", "ntp", "443", "400-500", "1-1024", "123", "8000-8080"]
+    zones = ["dmz1", "dmz2", "internal"]
+
+    for trial in range(50):
+        acl_list = [
+            get_rule(
+                f"r{number}",
+                source=", ".join(generator.sample(addresses, generator.randint(1, 2))),
+                destination=", ".join(generator.sample(addresses, generator.randint(1, 2))),
+                port=", ".join(generator.sample(ports, generator.randint(1, 2))),
+                action=generator.choice(["Permit", "Deny"]),
+                enable=generator.choice(["Yes", "Yes", "Yes", "No"]),
+                row=number + 2,
+                source_zone=generator.choice(zones),
+                destination_zone=generator.choice(zones),
+            )
+            for number in range(30)
+        ]
+        report = analyze_rules(acl_list, catalog)
+        shadowed, redundant = get_brute_force_report(acl_list, catalog)
+
+        assert report["shadowed"] == shadowed, f"trial {trial}"
+        assert report["redundant"] == redundant, f"trial {trial}"
+
+
+def write_queries(file_name, queries):
+    with open(file_name, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(query_columns)
+        writer.writerows(queries)
+
+
+def test_query_flows(tmp_path):
+    acl_list = [
+        get_rule("r1", port="443", action="Deny", enable="No"),
+        get_rule("r2", source="10.0.1.0/24", port="400-500", action="Deny", row=3),
+        get_rule("r3", port="https", row=4),
+        get_rule("r4", source="any", destination="any", port="any", source_zone="internal", row=5),
+    ]
+    flow_lookup = FlowLookupClass(acl_list, get_catalog())
+    query_filename = tmp_path / "queries.csv"
+    write_queries(
+        query_filename,
+        [
+            # First enabled matching rule - r1 is disabled, r3 comes after r2
+            ("dmz1", "web", "dmz2", "10.0.2.5", "tcp", "https"),
+            # Only "any" of r4 matches, for each zone of zone set internal
+            ("internal", "192.168.1.1", "dmz2", "db", "tcp", "8080"),
+            # No rule from dmz2 to dmz1
+            ("dmz2", "db", "dmz1", "web", "tcp", "443"),
+        ],
+    )
+
+    report = query_flows(flow_lookup, query_filename)
+
+    assert (report["queries"], report["permitted"], report["denied"], report["no_match"]) == (3, 1, 1, 1)
+    assert [
+        (result["Result"], result["Row"], result[RuleColumnName]) for result in report["results"]
+    ] == [("denied", 3, "r2"), ("permitted", 5, "r4"), ("denied", "", "")]
+
+
+def test_query_flows_malformed_row(tmp_path):
+    flow_lookup = FlowLookupClass([get_rule("r1")], get_catalog())
+    query_filename = tmp_path / "queries.csv"
+    write_queries(query_filename, [("dmz1", "web", "dmz2", "db", "tcp", "https"), ("dmz1", "web", "dmz2")])
+
+    with pytest.raises(ValueError, match="line 3"):
+        query_flows(flow_lookup, query_filename)
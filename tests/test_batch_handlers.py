@@ -0,0 +1,42 @@
+import os
+import shutil
+
+import pytest
+
+from batch_handlers import find_workbooks, run_batch
+from constdefs import *
+from sample_rules import write_workbook
+
+rules = [("r1", "web to db", "tcp", "dmz1", "web", "dmz2", "db", "https", "Permit", "Yes", "No")]
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    # Config is saved in output/ of the current directory, standard applications are read from it
+    repository_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    shutil.copy(os.path.join(repository_dir, junos_app_definitions), tmp_path)
+    monkeypatch.chdir(tmp_path)
+
+
+def test_workbooks_with_the_same_name_are_saved_apart(tmp_path):
+    for site in ("east", "west"):
+        os.makedirs(tmp_path / "sites" / site)
+        write_workbook(str(tmp_path / "sites" / site / "fw.xlsx"), rules)
+
+    report = run_batch(find_workbooks("sites/*/*.xlsx"), ["junos"], use_cache=False)
+
+    assert report["ok"] == 2
+    assert [os.path.basename(result["files"][0]).rsplit("-", 4)[0] for result in report["results"]] == [
+        "east-fw",
+        "west-fw",
+    ]
+
+
+def test_workbooks_with_the_same_output_file_are_rejected(tmp_path):
+    os.makedirs(tmp_path / "sites")
+    for name in ("FW.xlsx", "fw.xlsx"):
+        write_workbook(str(tmp_path / "sites" / name), rules)
+
+    with pytest.raises(ValueError):
+        run_batch(find_workbooks("sites"), ["junos"], use_cache=False)
+    assert not os.listdir(tmp_path / "output")
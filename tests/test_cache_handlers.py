@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+import pytest
+
+from cache_handlers import get_cache_filename, load_cached_sheet, save_cached_sheet
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    # Snapshots are saved in cache/ of the current directory
+    monkeypatch.chdir(tmp_path)
+
+
+def test_snapshot_is_read_back():
+    dataframe = pd.DataFrame({"Flow Name": ["r1", "r2"]})
+    save_cached_sheet("abc", "Traffic Flows", dataframe)
+
+    assert load_cached_sheet("abc", "Traffic Flows").equals(dataframe)
+    assert pd.__version__ in get_cache_filename("abc", "Traffic Flows")
+
+
+def test_corrupt_snapshot_is_removed():
+    save_cached_sheet("abc", "Traffic Flows", pd.DataFrame({"Flow Name": ["r1"]}))
+    cache_filename = get_cache_filename("abc", "Traffic Flows")
+    with open(cache_filename, "wb") as f:
+        f.write(b"not a pickle")
+
+    assert load_cached_sheet("abc", "Traffic Flows") is None
+    assert not os.path.exists(cache_filename)
+    assert load_cached_sheet("abc", "Zones") is None
@@ -0,0 +1,32 @@
+from classdefs import AddressBookEntryClass, ApplicationClass, split_field
+from sample_rules import get_catalog, get_rule
+
+
+def test_rules_are_slotted_with_tuple_fields():
+    acl = get_rule("r1", source="web, 10.0.3.0/24", port="https, 8000-8010")
+
+    assert not hasattr(acl, "__dict__")
+    assert acl.SourceNetworkAndMask == ("web", "10.0.3.0/24")
+    assert acl.DestinationPort == ("https", "8000-8010")
+    assert split_field("any") == ("any",)
+
+
+def test_network_entries_are_shared_between_rules():
+    catalog = get_catalog()
+    first = AddressBookEntryClass(catalog, "r1", "", ("10.0.3.0/24",), ("db",)).AddressBook["items"]
+    second = AddressBookEntryClass(catalog, "r2", "", ("10.0.3.0/24",), ("web",)).AddressBook["items"]
+
+    assert first[0] is second[0]
+    assert first[0].name == "net-10.0.3.0_24"
+    assert first[1].value == "10.0.2.0/24"
+
+
+def test_application_entries_keep_ports():
+    applications = ApplicationClass(get_catalog(), "tcp", ("https", "ntp", "ospf", "8000-8010")).DestinationPortList
+
+    assert [tuple(entry) for entry in applications] == [
+        ("tcp-https", "tcp", 443),
+        ("udp-ntp", "udp", 123),
+        ("ospf", "ospf", 0),
+        ("tcp-8000-8010", "tcp", "8000-8010"),
+    ]
@@ -0,0 +1,85 @@
+import pytest
+
+from constdefs import *
+import data_handlers
+from classdefs import AccessRuleClass
+from data_handlers import (
+    build_catalog,
+    iter_config,
+    load_source,
+    parse_flows_dataframes,
+    stream_source,
+    write_config,
+)
+from sample_rules import get_catalog, get_flow_rows, get_rule, write_workbook
+
+
+def test_config_has_address_book_then_rules_by_action():
+    acl_list = [get_rule("r1"), get_rule("r2", enable="No", row=3)]
+    config = "".join(iter_config(acl_list, [ActionEnable, ActionDeactivate], get_catalog(), "junos"))
+
+    assert config.index("address-book global address web") < config.index("policy r1 ") < config.index("policy r2")
+    assert config.count("address-book global address db") == 1
+    assert "deactivate security policies global policy r2" in config
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    file_name = tmp_path / "junos.txt"
+    file_name.write_text("previous config")
+
+    def fragments():
+        yield "new config"
+        raise ValueError("Conflicting address book definitions")
+
+    with pytest.raises(ValueError):
+        write_config(fragments(), str(file_name))
+
+    assert file_name.read_text() == "previous config"
+    assert [path.name for path in tmp_path.iterdir()] == ["junos.txt"]
+
+    assert write_config(iter(["new config"]), str(file_name)) == len("new config")
+    assert file_name.read_text() == "new config"
+
+
+@pytest.mark.parametrize("optimize_addresses", [False, True])
+def test_parallel_config_is_identical_to_serial(tmp_path, monkeypatch, optimize_addresses):
+    workbook_name = tmp_path / "flows.xlsx"
+    write_workbook(workbook_name, get_flow_rows(40))
+    # Several shards for each worker, so results are queued and read back in order
+    monkeypatch.setattr(data_handlers, "render_shard_size", 3)
+
+    configs = []
+    for jobs in (1, 2):
+        catalog, action_list, acl_list = stream_source(workbook_name)
+        file_name = tmp_path / f"junos-{jobs}.txt"
+        write_config(iter_config(acl_list, action_list, catalog, "junos", jobs, optimize_addresses), str(file_name))
+        configs.append(file_name.read_bytes())
+
+    assert configs[0] == configs[1]
+    assert b"policy rule38 " in configs[0]
+
+
+def get_rule_values(acl):
+    return tuple(getattr(acl, name) for name in AccessRuleClass.__slots__)
+
+
+def test_stream_and_dataframe_rules_are_identical(tmp_path):
+    workbook_name = tmp_path / "flows.xlsx"
+    write_workbook(workbook_name, get_flow_rows(20))
+
+    traffic_flows, address_book, zones, standard_apps = load_source(workbook_name, use_cache=False)
+    acl_list, action_list = parse_flows_dataframes(traffic_flows)
+    catalog = build_catalog(address_book, zones, standard_apps)
+    stream_catalog, stream_action_list, stream_acl_list = stream_source(workbook_name)
+    stream_acl_list = list(stream_acl_list)
+
+    assert stream_action_list == action_list == [ActionEnable, ActionDelete, ActionDeactivate]
+    assert (stream_catalog.Zones, stream_catalog.Applications, stream_catalog.AddressBook) == (
+        catalog.Zones,
+        catalog.Applications,
+        catalog.AddressBook,
+    )
+    # Rows without action are skipped. Dataframe rules are grouped by action, stream rules are in sheet order
+    assert len(stream_acl_list) == 16
+    stream_acl_list.sort(key=lambda acl: action_list.index(acl.Action))
+    assert [get_rule_values(acl) for acl in acl_list] == [get_rule_values(acl) for acl in stream_acl_list]
@@ -0,0 +1,22 @@
+import pytest
+
+from fw_build import parse_args
+
+
+def test_incremental_is_rejected_with_sqlite_subset():
+    with pytest.raises(SystemExit):
+        parse_args(["--sqlite", "rules.db", "--zone-pair", "dmz1,dmz2", "--incremental"])
+    with pytest.raises(SystemExit):
+        parse_args(["--sqlite", "rules.db", "--address", "10.0.0.1", "--incremental"])
+
+    assert parse_args(["--sqlite", "rules.db", "--incremental"]).incremental
+
+
+def test_zone_pair_needs_two_zones():
+    assert parse_args(["--sqlite", "rules.db", "--zone-pair", "dmz1, internet-untrust"]).zone_pair == [
+        "dmz1",
+        "internet-untrust",
+    ]
+    for zone_pair in ("dmz1", "dmz1,dmz2,dmz3", "dmz1,"):
+        with pytest.raises(SystemExit):
+            parse_args(["--sqlite", "rules.db", "--zone-pair", zone_pair])
@@ -0,0 +1,109 @@
+import pytest
+
+from fake_device import get_connect
+from network_handlers import push_config, validate_config_fragments, validate_config_on_device
+
+
+def get_config(rule_count=4):
+    lines = ["", "", "# ------------------------ Address Book ---------------------------------"]
+    lines += [f"set security address-book global address host{i} 10.0.0.{i}/32" for i in range(rule_count)]
+    lines += ["", "", "# ------------------------ Rules to Enable ---------------------------------"]
+    for i in range(rule_count):
+        lines += [
+            f"# -------- rule {i} -------------",
+            f'set security policies global policy rule{i}  description "rule {i}" match from-zone [dmz1] '
+            f"to-zone [dmz2] source-address [host{i}] destination-address [any] application [junos-https]",
+            f"set security policies global policy rule{i} then permit",
+            f"activate security policies global policy rule{i}",
+        ]
+    return lines
+
+
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    # Fragment cache is saved in cache/ of the current directory
+    monkeypatch.chdir(tmp_path)
+
+
+def test_passed_rules_are_cached():
+    connect = get_connect()
+    result = validate_config_fragments(connect(), get_config(), push_method="chunked")
+    assert result["status"] == "passed"
+    assert result["commit_checks"] == 1
+
+    result = validate_config_fragments(connect(), get_config(), push_method="chunked")
+    assert result["status"] == "passed"
+    assert result["cached"] == 4
+    assert result["commit_checks"] == 0
+
+
+def test_failing_rule_is_found_and_not_cached():
+    connect = get_connect(is_invalid=lambda statements: any("policy rule2 " in line for line in statements))
+
+    result = validate_config_fragments(connect(), get_config(), push_method="chunked")
+    assert result["status"] == "failed"
+    assert [failed["fragment"] for failed in result["failed_fragments"]] == ["rule2"]
+
+    result = validate_config_fragments(connect(), get_config(), push_method="chunked")
+    assert result["status"] == "failed"
+    assert result["cached"] == 3
+    assert result["commit_checks"] == 1
+
+
+def test_rules_failing_only_together_are_reported_and_not_cached():
+    # Each half of the group passes on its own
+    def is_invalid(statements):
+        config = "\n".join(statements)
+        return "policy rule0 " in config and "policy rule3 " in config
+
+    connect = get_connect(is_invalid=is_invalid)
+
+    for _ in range(2):
+        result = validate_config_fragments(connect(), get_config(), push_method="chunked")
+        assert result["status"] == "failed"
+        assert result["cached"] == 0
+        assert [failed["fragment"] for failed in result["failed_fragments"]] == ["rule0, rule1, rule2, rule3"]
+
+
+def test_device_is_rolled_back_and_disconnected():
+    connect = get_connect(is_invalid=lambda statements: True)
+    result = validate_config_on_device(get_config(), {"name": "lab-srx"}, connect=connect, push_method="chunked")
+
+    assert result["status"] == "failed"
+    assert connect.Connection.Statements == []
+    assert connect.Connection.Disconnected
+
+
+def test_device_is_given_up_at_the_deadline():
+    connect = get_connect(commit_check_delay=30)
+    result = validate_config_on_device(
+        get_config(), {"name": "lab-srx"}, connect=connect, push_method="chunked", deadline=0.5
+    )
+
+    assert result["status"] == "error"
+    assert result["error"] == "Deadline of 0.5 seconds exceeded"
+    assert result["timings"]["total"] < 5
+    assert connect.Connection.Disconnected
+
+
+def test_config_file_is_deleted_and_load_errors_are_raised(monkeypatch):
+    copied = []
+    monkeypatch.setattr("network_handlers.file_transfer", lambda net_connect, **kwargs: copied.append(kwargs))
+    connect = get_connect(load_output="terminal:3:(8) syntax error: permitt\nload complete (1 errors)")
+
+    with pytest.raises(ValueError):
+        push_config(connect(), get_config(), push_method="scp")
+    assert connect.Connection.DeletedFiles == [f"/var/tmp/{copied[0]['dest_file']}"]
+
+
+def test_push_falls_back_to_batches_only_if_file_is_not_copied(monkeypatch):
+    def file_transfer(net_connect, **kwargs):
+        raise ValueError("Insufficient space available on remote device")
+
+    monkeypatch.setattr("network_handlers.file_transfer", file_transfer)
+    connect = get_connect()
+
+    push_result = push_config(connect(), get_config(), push_method="scp")
+    assert push_result["method"] == "chunked"
+    assert "Insufficient space" in push_result["fallback_reason"]
+    assert "set security policies global policy rule0 then permit" in connect.Connection.Statements
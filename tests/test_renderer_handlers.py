@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from analysis_handlers import check_references
+from constdefs import *
+from data_handlers import render_acl
+from sample_rules import get_catalog, get_rule
+
+
+def test_junos_uses_standard_applications_and_defines_others():
+    fragments, address_entries = render_acl(get_rule("r1", port="https, ntp, ospf, 8080"), get_catalog(), "junos")
+    config = "".join(fragments)
+
+    assert "application [junos-https junos-ntp junos-ospf tcp-8080]" in config
+    assert "set applications application tcp-8080 protocol tcp destination-port 8080" in config
+    assert "set security policies global policy r1 then permit" in config
+    assert address_entries == [
+        ("web", "set security address-book global address web 10.0.1.10/32"),
+        ("db", "set security address-book global address db 10.0.2.0/24"),
+    ]
+
+
+def test_asa_services_keep_ports_of_udp_applications():
+    fragments, object_entries = render_acl(get_rule("r1", port="https, ntp, ospf"), get_catalog(), "asa")
+    objects = dict(object_entries)
+
+    assert "access-list dmz1-in extended permit object-group r1-svc object web object db" in "".join(fragments)
+    assert objects["tcp-https"] == "object service tcp-https\n service tcp destination eq 443"
+    assert objects["udp-ntp"] == "object service udp-ntp\n service udp destination eq 123"
+    assert objects["ospf"] == "object service ospf\n service ospf"
+    assert objects["db"] == "object network db\n subnet 10.0.2.0 255.255.255.0"
+
+
+def test_asa_rejects_udp_application_without_port():
+    catalog = get_catalog(applications=[("tftp-any", "udp", 0)])
+    with pytest.raises(ValueError):
+        render_acl(get_rule("r1", port="tftp-any"), catalog, "asa")
+
+    report = check_references([get_rule("r1", port="tftp-any")], catalog, ["asa"])
+    assert [error["value"] for error in report["errors"]] == ["tftp-any"]
+
+
+def test_asa_rejects_rule_without_networks_to_configure():
+    # Shared address space is neither private nor global, so it's dropped
+    with pytest.raises(ValueError):
+        render_acl(get_rule("r1", source="100.64.0.0/11"), get_catalog(), "asa")
+
+    fragments, object_entries = render_acl(get_rule("r1", source="any"), get_catalog(), "asa")
+    assert "access-list dmz1-in extended permit object tcp-https any object db" in "".join(fragments)
+
+
+def test_changed_standard_applications_are_used(tmp_path, monkeypatch):
+    repository_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    shutil.copy(os.path.join(repository_dir, junos_app_definitions), tmp_path)
+    monkeypatch.chdir(tmp_path)
+
+    rule = get_rule("r1", port="8080")
+    assert "application [tcp-8080]" in "".join(render_acl(rule, get_catalog(), "junos")[0])
+
+    with open(junos_app_definitions) as f:
+        standard_apps = json.load(f)
+    standard_apps.append({"name": "junos-http-alt", "protocol": "tcp", "destination-port": "8080"})
+    with open(junos_app_definitions, "w") as f:
+        json.dump(standard_apps, f)
+    # Modification time can be the same within file system resolution
+    modified = os.stat(junos_app_definitions).st_mtime_ns + 1000000000
+    os.utime(junos_app_definitions, ns=(modified, modified))
+
+    assert "application [junos-http-alt]" in "".join(render_acl(rule, get_catalog(), "junos")[0])
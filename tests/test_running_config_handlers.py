@@ -0,0 +1,70 @@
+import collections
+
+from constdefs import *
+from data_handlers import iter_config
+from running_config_handlers import RunningConfigClass, iter_running_config_delta, tokenize
+from sample_rules import get_catalog, get_rule
+
+running_statements = """
+set security address-book global address web 10.0.1.10/32
+set security address-book global address db 10.0.9.0/24
+set security policies global policy r1 description "r1 rule"
+set security policies global policy r1 match from-zone dmz1
+set security policies global policy r1 match to-zone dmz2
+set security policies global policy r1 match source-address web
+set security policies global policy r1 match destination-address db
+set security policies global policy r1 match application junos-https
+set security policies global policy r1 then permit
+set security policies global policy r2 description "r2 rule"
+set security policies global policy r2 match from-zone dmz1
+set security policies global policy r2 match to-zone dmz2
+set security policies global policy r2 match source-address web
+set security policies global policy r2 match destination-address db
+set security policies global policy r2 match application junos-https
+set security policies global policy r2 match application junos-http
+set security policies global policy r2 then permit
+set security policies global policy r2 then log session-close
+deactivate security policies global policy r2
+"""
+
+
+def get_delta(acl_list):
+    running_config = RunningConfigClass()
+    for statement in running_statements.splitlines():
+        running_config.add_statement(statement)
+
+    config = "".join(iter_config(acl_list, [ActionEnable], get_catalog(), "junos"))
+    summary = collections.Counter(emitted=0, unchanged=0, deleted=0)
+    return list(iter_running_config_delta(config.splitlines(), running_config, summary)), summary
+
+
+def test_tokenize_keeps_quoted_values_and_brackets():
+    assert tokenize('set policy r1 description "r1 rule" match from-zone [a b]') == [
+        "set", "policy", "r1", "description", "r1 rule", "match", "from-zone", "[", "a", "b", "]"
+    ]
+
+
+def test_only_missing_statements_are_emitted():
+    delta, summary = get_delta([get_rule("r1"), get_rule("r2", port="https, 8080", row=3)])
+    statements = [line for line in delta if line and not line.startswith("#")]
+
+    assert statements == [
+        "set security address-book global address db 10.0.2.0/24",
+        "delete security policies global policy r2 match application junos-http",
+        "set applications application tcp-8080 protocol tcp destination-port 8080",
+        "set security policies global policy r2 match application tcp-8080",
+        "activate security policies global policy r2",
+    ]
+    # Rule without statements left is removed with its comment, settings not generated are kept
+    assert "# -------- r1 rule -------------" not in delta
+    assert "# -------- r2 rule -------------" in delta
+    assert summary["deleted"] == 1
+    assert summary["emitted"] == 4
+
+
+def test_nothing_is_emitted_for_config_on_the_device():
+    delta, summary = get_delta([get_rule("r1")])
+    assert [line for line in delta if line and not line.startswith("#")] == [
+        "set security address-book global address db 10.0.2.0/24"
+    ]
+    assert summary["unchanged"] > 0
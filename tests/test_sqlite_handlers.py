@@ -0,0 +1,63 @@
+import os
+
+import openpyxl
+import pytest
+
+from constdefs import *
+from sqlite_handlers import import_source, read_store
+from sample_rules import write_workbook
+
+rules = [
+    ("r1", "web to db", "tcp", "dmz1", "web", "dmz2", "db", "https", "Permit", "Yes", "No"),
+    ("r2", "db to web", "tcp", "dmz2", "db", "dmz1", "web", "https", "Permit", "Yes", "No"),
+    ("r3", "internal to db", "tcp", "internal", "10.0.3.0/24", "dmz2", "db", "ntp", "Permit", "Yes", "No"),
+    ("r4", "no action", "tcp", "dmz1", "web", "dmz2", "db", "https", "Permit", "", ""),
+]
+
+
+@pytest.fixture
+def db_filename(tmp_path):
+    source_filename = str(tmp_path / "rules.xlsx")
+    write_workbook(source_filename, rules)
+    db_filename = str(tmp_path / "rules.db")
+    assert import_source(source_filename, db_filename) == 4
+    return db_filename
+
+
+def get_names(db_filename, **filters):
+    catalog, action_list, acl_list = read_store(db_filename, **filters)
+    return [acl.Name for acl in acl_list]
+
+
+def test_all_rules_are_read_in_sheet_order(db_filename):
+    catalog, action_list, acl_list = read_store(db_filename)
+
+    assert [(acl.Name, acl.Row) for acl in acl_list] == [("r1", 2), ("r2", 3), ("r3", 4)]
+    assert catalog.Applications["ntp"] == ("udp", 123)
+
+
+def test_zone_pair_matches_zone_sets(db_filename):
+    assert get_names(db_filename, zone_pair=["dmz1", "dmz2"]) == ["r1", "r3"]
+    assert get_names(db_filename, zone_pair=["dmz2", "dmz1"]) == ["r2"]
+    assert get_names(db_filename, zone_pair=["dmz2", "dmz2"]) == ["r3"]
+
+
+def test_address_and_name_filters(db_filename):
+    assert get_names(db_filename, address="db") == ["r1", "r2", "r3"]
+    assert get_names(db_filename, address="10.0.3.0/24") == ["r3"]
+    assert get_names(db_filename, address="web", zone_pair=["dmz2", "dmz1"]) == ["r2"]
+    assert get_names(db_filename, name="r3") == ["r3"]
+
+
+def test_failed_import_keeps_previous_store(db_filename, tmp_path):
+    broken_filename = str(tmp_path / "broken.xlsx")
+    write_workbook(broken_filename, rules)
+    workbook = openpyxl.load_workbook(broken_filename)
+    workbook.remove(workbook[address_book_sheet_name])
+    workbook.save(broken_filename)
+
+    with pytest.raises(KeyError):
+        import_source(broken_filename, db_filename)
+
+    assert get_names(db_filename) == ["r1", "r2", "r3"]
+    assert sorted(os.listdir(tmp_path)) == ["broken.xlsx", "rules.db", "rules.xlsx"]
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from constdefs import *
+from sample_rules import get_catalog, get_rule
+from data_handlers import iter_config
+from state_handlers import diff_rules, load_state, save_state
+
+
+@pytest.fixture(autouse=True)
+def repository_dir(monkeypatch):
+    # Standard applications are part of the state context and are read from the current directory
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_rules():
+    return [get_rule("r1", row=2), get_rule("r2", destination="web", row=3), get_rule("r3", port="ntp", row=4)]
+
+
+def test_unchanged_rules_are_skipped():
+    acl_list, state, summary = diff_rules(get_rules(), get_catalog(), "junos", {})
+    assert [acl.Name for acl in acl_list] == ["r1", "r2", "r3"]
+    assert summary["new"] == 3
+
+    acl_list, state, summary = diff_rules(get_rules(), get_catalog(), "junos", state)
+    assert acl_list == []
+    assert summary == {"new": 0, "changed": 0, "unchanged": 3, "removed": 0}
+
+
+def test_changed_rule_and_changed_reference_are_rebuilt():
+    acl_list, state, summary = diff_rules(get_rules(), get_catalog(), "junos", {})
+
+    rules = get_rules()
+    rules[2] = get_rule("r3", port="https", row=4)
+    catalog = get_catalog()
+    catalog.AddressBook["web"] = "10.0.1.11/32"
+
+    acl_list, state, summary = diff_rules(rules, catalog, "junos", state)
+    # r1 and r2 reference web, r3 has a different port
+    assert [acl.Name for acl in acl_list] == ["r1", "r2", "r3"]
+    assert summary["changed"] == 3
+
+    acl_list, state, summary = diff_rules(rules[:1], catalog, "junos", state)
+    assert [(acl.Name, acl.Action) for acl in acl_list] == [("r2", ActionDelete), ("r3", ActionDelete)]
+    assert summary["removed"] == 2
+
+
+def test_other_network_os_rebuilds_all_rules():
+    acl_list, state, summary = diff_rules(get_rules(), get_catalog(), "junos", {})
+    acl_list, state, summary = diff_rules(get_rules(), get_catalog(), "asa", state)
+    assert summary["new"] == 3
+
+
+def test_state_is_saved_and_loaded(tmp_path):
+    state_filename = str(tmp_path / "output" / "rules-junos-state.json")
+    assert load_state(state_filename) == {}
+
+    acl_list, state, summary = diff_rules(get_rules(), get_catalog(), "junos", {})
+    save_state(state, state_filename)
+    assert load_state(state_filename) == state
+    assert os.listdir(tmp_path / "output") == ["rules-junos-state.json"]
+
+
+def test_narrowed_rule_replaces_its_match_conditions():
+    acl_list, state, summary = diff_rules(get_rules(), get_catalog(), "junos", {})
+
+    rules = get_rules()
+    rules[0] = get_rule("r1", source="web", port="https", row=2)
+    rules[1] = get_rule("r2", source="web", destination="web", port="https", row=3)
+    rules[2] = get_rule("r3", port="ntp", source="web", destination="web", row=4)
+    acl_list, state, summary = diff_rules(rules, get_catalog(), "junos", state)
+    assert [acl.Name for acl in acl_list] == ["r3"]
+
+    config = "".join(iter_config(acl_list, [ActionEnable], get_catalog(), "junos"))
+    statements = [line for line in config.splitlines() if "policy r3" in line]
+    assert statements[0] == "delete security policies global policy r3 match"
+    assert "destination-address [web]" in statements[1]
+    assert "delete" not in "".join(iter_config(get_rules(), [ActionEnable], get_catalog(), "junos"))
@@ -0,0 +1,193 @@
+import os
+import time
+from datetime import datetime
+
+from constdefs import *
+from data_handlers import (
+    assemble_config,
+    build_catalog_from_rows,
+    find_address_sets,
+    flow_column_names,
+    get_action_list,
+    parse_flow_row,
+    render_acl,
+    select_columns,
+    write_config,
+)
+from renderer_handlers import get_renderer
+from state_handlers import fingerprint_rule, get_context_fingerprint
+
+reference_sheet_names = [address_book_sheet_name, zones_sheet_name, standard_apps_sheet_name]
+
+
+# --------------------------------------- Classes - WatchClass ---------------------------------------
+class WatchClass:
+
+    """ Source workbook kept in memory between saves - sheet rows, parsed rules, catalog and rendered rules.
+    On refresh the catalog is rebuilt only if a reference sheet has changed, only changed rows are parsed again,
+    and only rules which are new or reference changed catalog entries are rendered again
+    """
+
+    def __init__(self, source_filename, network_os_list, file_names, optimize_addresses=False):
+        """
+        :param source_filename: source Excel file
+        :param network_os_list: list of Network OS, such as ["junos"]
+        :param file_names: output file for each Network OS
+        :param optimize_addresses: aggregate networks and use address sets, see iter_config
+        """
+        self.SourceFilename = source_filename
+        self.NetworkOsList = network_os_list
+        self.FileNames = file_names
+        self.OptimizeAddresses = optimize_addresses
+
+        self.SheetRows = {}
+        self.Catalog = None
+        self.AddressSets = None
+        # (row number, Traffic Flows row) -> AccessRuleClass object, rows are parsed again only when changed
+        self.ParsedRows = {}
+        # (row number, Traffic Flows row) -> rule fingerprint, reset when the catalog is rebuilt
+        self.Fingerprints = {}
+        # (Network OS, context fingerprint, rule fingerprint) -> (action, rendered rule, address book entries)
+        self.Rendered = {}
+
+    def read_sheets(self):
+        """
+        :return: dictionary sheet name -> list of row tuples, headers first
+        """
+
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(self.SourceFilename, read_only=True, data_only=True)
+        try:
+            return {
+                sheet_name: list(workbook[sheet_name].iter_rows(values_only=True))
+                for sheet_name in [traffic_flows_sheet_name] + reference_sheet_names
+            }
+        finally:
+            workbook.close()
+
+    def refresh(self):
+        """
+        Read the workbook and write config for each Network OS
+
+        :return: summary dictionary - changed sheets, number of rules, parsed rows, rendered and reused rules, seconds
+        """
+
+        started = time.perf_counter()
+        sheet_rows = self.read_sheets()
+        changed_sheets = [
+            sheet_name for sheet_name, rows in sheet_rows.items() if self.SheetRows.get(sheet_name) != rows
+        ]
+        self.SheetRows = sheet_rows
+        summary = {"changed_sheets": changed_sheets, "rules": 0, "parsed": 0, "rendered": 0, "reused": 0}
+
+        if self.Catalog is None or set(changed_sheets) & set(reference_sheet_names):
+            self.Catalog = build_catalog_from_rows(sheet_rows)
+            # Fingerprints include referenced catalog entries
+            self.Fingerprints = {}
+
+        flows_headers = sheet_rows[traffic_flows_sheet_name][0] if sheet_rows[traffic_flows_sheet_name] else ()
+        action_list = get_action_list([str(header) for header in flows_headers if header is not None])
+
+        # Header is the first row. Only rows which are new or changed are parsed and fingerprinted
+        flow_rows = list(enumerate(select_columns(sheet_rows[traffic_flows_sheet_name], flow_column_names), 2))
+        parsed_rows = {}
+        fingerprints = {}
+        acl_list = []
+        for row_number, row in flow_rows:
+            key = (row_number, row)
+            if key in self.ParsedRows:
+                acl = self.ParsedRows[key]
+            else:
+                acl = parse_flow_row(row, row_number)
+                summary["parsed"] += 1
+            parsed_rows[key] = acl
+            if acl is None or acl.Action not in action_list:
+                continue
+            fingerprints[key] = (
+                self.Fingerprints[key] if key in self.Fingerprints else fingerprint_rule(acl, self.Catalog)
+            )
+            acl_list.append((acl, fingerprints[key]))
+        # Rows which are not in the workbook anymore are dropped
+        self.ParsedRows = parsed_rows
+        self.Fingerprints = fingerprints
+        summary["rules"] = len(acl_list)
+
+        if self.OptimizeAddresses:
+            address_sets = find_address_sets([acl for acl, fingerprint in acl_list], self.Catalog)
+            if address_sets != self.AddressSets:
+                # Address sets are shared by rules, so all rules are rendered again
+                self.Rendered = {}
+            self.AddressSets = address_sets
+
+        rendered = {}
+
+        for device_os, file_name in zip(self.NetworkOsList, self.FileNames):
+            # Standard applications can change while watching, rules are rendered again then
+            context = get_context_fingerprint(device_os)
+            rendered_acls = []
+            for acl, fingerprint in acl_list:
+                key = (device_os, context, fingerprint)
+                if key not in rendered:
+                    if key in self.Rendered:
+                        rendered[key] = self.Rendered[key]
+                        summary["reused"] += 1
+                    else:
+                        fragments, address_entries = render_acl(acl, self.Catalog, device_os, self.AddressSets)
+                        rendered[key] = (acl.Action, "".join(fragments), address_entries)
+                        summary["rendered"] += 1
+                rendered_acls.append(rendered[key])
+
+            write_config(assemble_config(rendered_acls, action_list, get_renderer(device_os)), file_name)
+
+        # Rules which are not in the workbook anymore are dropped
+        self.Rendered = rendered
+        summary["seconds"] = round(time.perf_counter() - started, 4)
+
+        return summary
+
+
+# -------------------------------------------------------------------------------------------
+
+
+def watch_source(watch, interval=1.0):
+    """
+    Refresh config each time the source file or the standard applications file is saved,
+    until interrupted with Ctrl+C
+
+    :param watch: WatchClass object
+    :param interval: seconds between checks of the file modification time
+    """
+
+    last_modified = None
+
+    try:
+        while True:
+            try:
+                stat = os.stat(watch.SourceFilename)
+                modified = (stat.st_mtime_ns, stat.st_size, os.stat(junos_app_definitions).st_mtime_ns)
+            except FileNotFoundError:
+                # Excel replaces the file on save, it can be missing for a moment
+                modified = None
+
+            if modified is not None and modified != last_modified:
+                last_modified = modified
+                try:
+                    print_watch_summary(watch.refresh())
+                except Exception as e:
+                    # File is still being written or has errors, it's read again on the next save
+                    print(f"{datetime.now().strftime('%H:%M:%S')} {watch.SourceFilename} not refreshed: {e}")
+
+            time.sleep(interval)
+
+    except KeyboardInterrupt:
+        print("\nWatch stopped")
+
+
+def print_watch_summary(summary):
+
+    print(
+        f"{datetime.now().strftime('%H:%M:%S')} config refreshed in {summary['seconds']:.3f}s: "
+        f"{summary['rules']} rules, {summary['parsed']} rows parsed, {summary['rendered']} rendered, {summary['reused']} reused, "
+        f"changed sheets: {', '.join(summary['changed_sheets']) or 'none'}"
+    )